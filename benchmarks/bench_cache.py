@@ -0,0 +1,142 @@
+"""Benchmark loading the local Todoist state of a synthetic account
+
+Compares the JSON cache of the Todoist client, which every run used to load
+into model objects, with the snapshot `gateways.Todoist` keeps now. Each
+variant runs in a fresh process, which reports the time to load the state,
+to look up a few tasks by ID and to look up the tasks of one project, and
+its peak RSS after each step, as JSON:
+
+    $ python -m benchmarks.bench_cache --tasks 20000 --output cache.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from todoist.api import TodoistAPI
+
+from todoist_taskwarrior import gateways, snapshot
+from . import synthetic
+
+TOKEN = 'benchmark'
+
+
+def peak_rss():
+    """Peak resident set size of this process, in MiB."""
+    kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kib / 1024
+
+
+def client_cache_variant(cache_dir):
+    api = TodoistAPI(TOKEN, cache=cache_dir)
+    items = {i['id']: i for i in api.state['items']}
+    return (
+        lambda ids: [items[tid] for tid in ids],
+        lambda project_id: [
+            i for i in api.state['items'] if i['project_id'] == project_id],
+    )
+
+
+def snapshot_variant(cache_dir):
+    td = gateways.Todoist(TOKEN, cache_dir)
+    td.state
+    return (
+        lambda ids: [td.get_task(tid) for tid in ids],
+        lambda project_id: td.get_tasks(filter_proj_id=project_id),
+    )
+
+
+VARIANTS = {
+    'client_cache': client_cache_variant,
+    'snapshot': snapshot_variant,
+}
+
+
+def measure(variant, cache_dir, task_ids, project_id):
+    """Run in a fresh process by `benchmark`.
+
+    Loads the state, then looks up `task_ids`, like an incremental sync,
+    then the tasks of a project, and records time and peak RSS after each
+    step.
+    """
+    result = {'variant': variant, 'baseline_rss_mib': peak_rss()}
+
+    def step(name, func, *args):
+        start = time.perf_counter()
+        value = func(*args)
+        result[f'{name}_seconds'] = time.perf_counter() - start
+        result[f'{name}_rss_mib'] = peak_rss()
+        return value
+
+    get_tasks, project_tasks = step('load', VARIANTS[variant], cache_dir)
+    step('lookup', get_tasks, task_ids)
+    result['project_tasks'] = len(step('project', project_tasks, project_id))
+    return result
+
+
+def benchmark(args):
+    state = synthetic.make_state(
+        tasks=args.tasks,
+        projects=args.projects,
+        labels=args.labels,
+        seed=args.seed,
+    )
+    workdir = tempfile.mkdtemp(prefix='todoist-taskwarrior-bench-')
+    try:
+        client_dir = os.path.join(workdir, 'client') + '/'
+        os.makedirs(client_dir)
+        synthetic.write_cache(state, client_dir, TOKEN)
+        snapshot_dir = os.path.join(workdir, 'snapshot') + '/'
+        snapshot.TodoistState(
+            state['items'], state['projects'], state['labels'],
+            state['sync_token'],
+        ).save(os.path.join(snapshot_dir, f'{TOKEN}.snapshot'))
+
+        sizes = {
+            'client_cache_bytes': os.path.getsize(f'{client_dir}{TOKEN}.json'),
+            'snapshot_bytes': os.path.getsize(f'{snapshot_dir}{TOKEN}.snapshot'),
+        }
+        task_ids = [i['id'] for i in state['items'][::args.tasks // args.changed]]
+        ctx = multiprocessing.get_context('spawn')
+        results = []
+        for variant, cache_dir in (('client_cache', client_dir),
+                                   ('snapshot', snapshot_dir)):
+            with ctx.Pool(1) as pool:
+                results.append(pool.apply(
+                    measure, (variant, cache_dir, task_ids, 1)))
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        'parameters': vars(args),
+        'files': sizes,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--labels', type=int, default=10)
+    parser.add_argument('--changed', type=int, default=100,
+                        help='Number of tasks looked up by ID')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    report = benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Benchmark the migrate/sync pipeline against a synthetic Todoist account
+
+Runs `synchronize`, `migrate`, `sync` and `revert` end-to-end against a local
+stand-in for the Todoist API and a throwaway Taskwarrior data dir, and
+reports wall time per command and the `--profile` summary of each stage
+as JSON:
+
+    $ python -m benchmarks.bench_pipeline --tasks 2000 --output bench.json
+
+With `--taskwarrior memory`, Taskwarrior is replaced by an in-memory client
+so only the cost of the Python code is measured.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from click.testing import CliRunner
+
+from todoist_taskwarrior import cli, gateways, journal, profiling, recurrences
+from . import synthetic
+
+TOKEN = 'benchmark'
+
+
+def make_taskrc(workdir):
+    data_dir = os.path.join(workdir, 'taskwarrior')
+    os.makedirs(data_dir)
+    taskrc = os.path.join(workdir, '.taskrc')
+    with open(taskrc, 'w') as f:
+        f.write(
+            f'data.location={data_dir}\n'
+            'confirmation=off\n'
+            'hooks=off\n'
+            'recurrence=yes\n'
+            'uda.todoist_id.type=string\n'
+        )
+    return taskrc
+
+
+def run_command(taskrc, output, *args):
+    """Run a CLI command and return its wall time and profile summary."""
+    profiling.reset()
+    profiling.enable()
+    start = time.perf_counter()
+    result = CliRunner().invoke(
+        cli.cli,
+        ['--todoist-api-key', TOKEN, '--tw-config-file', taskrc,
+         '--output', output] + list(args),
+        obj=cli.Ctx(),
+    )
+    elapsed = time.perf_counter() - start
+    profiling.enable(False)
+    if result.exit_code != 0:
+        raise RuntimeError(f'{args} failed:\n{result.output}') from result.exception
+    return dict(command=' '.join(args), seconds=elapsed, **profiling.summary())
+
+
+def benchmark(args):
+    state = synthetic.make_state(
+        tasks=args.tasks,
+        projects=args.projects,
+        depth=args.depth,
+        labels=args.labels,
+        recurring=args.recurring,
+        completed=args.completed,
+        seed=args.seed,
+    )
+    workdir = tempfile.mkdtemp(prefix='todoist-taskwarrior-bench-')
+    cache_dir = os.path.join(workdir, 'todoist') + '/'
+    taskrc = make_taskrc(workdir)
+
+    saved = (gateways.TODOIST_CACHE, gateways.TODOIST_API_ENDPOINT,
+             gateways.TaskWarrior, journal.JOURNAL_FILE,
+             recurrences.RECURRENCES_FILE)
+    try:
+        with synthetic.SyncServer(state) as server:
+            gateways.TODOIST_CACHE = cache_dir
+            gateways.TODOIST_API_ENDPOINT = server.url
+            # Keep the journal and the recurrence answers of the user alone
+            journal.JOURNAL_FILE = os.path.join(workdir, 'journal.jsonl')
+            recurrences.RECURRENCES_FILE = os.path.join(
+                workdir, 'recurrences.json')
+            if args.taskwarrior == 'memory':
+                # Keep one in-memory Taskwarrior across commands
+                tw = synthetic.MemoryTaskWarrior(taskrc)
+                gateways.TaskWarrior = lambda config_file: tw
+
+            migrate = ['migrate', '--no-sync', f'--jobs={args.jobs}']
+            if args.bulk:
+                migrate.append('--bulk')
+            results = [
+                run_command(taskrc, args.output_level, 'synchronize'),
+                run_command(taskrc, args.output_level, *migrate, '--full'),
+                run_command(taskrc, args.output_level, *migrate, '--full'),
+                run_command(taskrc, args.output_level, 'sync'),
+                run_command(taskrc, args.output_level, 'revert', '--yes'),
+            ]
+    finally:
+        (gateways.TODOIST_CACHE, gateways.TODOIST_API_ENDPOINT,
+         gateways.TaskWarrior, journal.JOURNAL_FILE,
+         recurrences.RECURRENCES_FILE) = saved
+        shutil.rmtree(workdir)
+
+    return {
+        'parameters': vars(args),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--labels', type=int, default=10)
+    parser.add_argument('--recurring', type=float, default=0.2,
+                        help='Fraction of recurring tasks')
+    parser.add_argument('--completed', type=float, default=0.1,
+                        help='Fraction of completed tasks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--bulk', action='store_true')
+    parser.add_argument('--taskwarrior', choices=['real', 'memory'],
+                        default='real')
+    parser.add_argument('--output-level', choices=['tasks', 'progress', 'summary'],
+                        default='tasks', help='Console output level of the commands')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    if args.taskwarrior == 'real' and not shutil.which('task'):
+        parser.error("the 'task' command was not found, use --taskwarrior memory")
+
+    report = benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
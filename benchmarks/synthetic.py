@@ -0,0 +1,215 @@
+"""Synthetic Todoist accounts and stand-ins for benchmarking
+
+Generates Todoist sync states of configurable size and shape, serves them
+from a local HTTP server that speaks enough of the sync API for
+`TodoistAPI.sync`, and provides an in-memory Taskwarrior client for
+measuring the Python side of the pipeline on its own.
+"""
+import json
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+from todoist_taskwarrior import gateways
+
+
+RECURRENCES = [
+    'every day',
+    'every other day',
+    'every week',
+    'every monday',
+    'every 2nd friday',
+    'every month',
+    'every 15th',
+    'every year',
+    'every weekday',
+    'every 3 hours',
+]
+
+
+def make_state(tasks=1000, projects=20, depth=3, labels=10, recurring=0.2,
+               completed=0.1, seed=0):
+    """Return a Todoist sync response for a full sync of a synthetic account.
+
+    Projects are nested up to `depth` levels. `recurring` and `completed`
+    are the fractions of tasks which recur or are checked.
+    """
+    rnd = random.Random(seed)
+    start = datetime(2019, 1, 1)
+
+    state_projects = []
+    for pid in range(1, projects + 1):
+        parents = [p for p in state_projects if p['_depth'] < depth]
+        parent = rnd.choice(parents) if parents and rnd.random() < 0.7 else None
+        state_projects.append({
+            'id': pid,
+            'name': f'Project {pid}',
+            'parent_id': parent['id'] if parent else None,
+            '_depth': parent['_depth'] + 1 if parent else 1,
+        })
+    for p in state_projects:
+        del p['_depth']
+
+    state_labels = [
+        {'id': lid, 'name': f'label{lid}'} for lid in range(1, labels + 1)
+    ]
+
+    items = []
+    for tid in range(1, tasks + 1):
+        added = start + timedelta(minutes=rnd.randrange(500000))
+        due = None
+        roll = rnd.random()
+        if roll < recurring:
+            due = {
+                'date': (added + timedelta(days=30)).strftime('%Y-%m-%d'),
+                'string': rnd.choice(RECURRENCES),
+                'is_recurring': True,
+                'timezone': None,
+                'lang': 'en',
+            }
+        elif roll < 0.6:
+            due = {
+                'date': (added + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M:%S'),
+                'string': 'in a week',
+                'is_recurring': False,
+                'timezone': None,
+                'lang': 'en',
+            }
+        items.append({
+            'id': 1000000 + tid,
+            'content': f'Synthetic task {tid}',
+            'project_id': rnd.randrange(1, projects + 1),
+            'labels': rnd.sample(range(1, labels + 1), rnd.randrange(min(labels, 3) + 1)),
+            'priority': rnd.randrange(1, 5),
+            'date_added': added.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'checked': int(rnd.random() < completed),
+            'due': due,
+        })
+
+    return {
+        'full_sync': True,
+        'sync_token': 'synthetic',
+        'items': items,
+        'projects': state_projects,
+        'labels': state_labels,
+    }
+
+
+def write_cache(state, cache_dir, token):
+    """Write `state` as the todoist-python cache for `token`."""
+    cache = {k: v for k, v in state.items() if k not in ('full_sync', 'sync_token')}
+    with open(f'{cache_dir}/{token}.json', 'w') as f:
+        json.dump(cache, f)
+    with open(f'{cache_dir}/{token}.sync', 'w') as f:
+        f.write(state['sync_token'])
+
+
+class SyncServer:
+    """Local stand-in for the Todoist sync API serving a synthetic state.
+
+    A sync with the initial token gets the full state, later syncs get an
+    empty delta. Commands are always acknowledged.
+    """
+
+    def __init__(self, state):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                form = parse_qs(body.decode())
+                response = server.respond(
+                    form['sync_token'][0], json.loads(form['commands'][0]))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(response).encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.state = state
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def respond(self, sync_token, commands):
+        if sync_token == '*':
+            response = dict(self.state)
+        else:
+            response = {'full_sync': False, 'sync_token': self.state['sync_token']}
+        response['sync_status'] = {c['uuid']: 'ok' for c in commands}
+        return response
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MemoryClient:
+    """In-memory replacement for the taskw client.
+
+    Used with `MemoryTaskWarrior` to time the pipeline without spawning
+    `task`, which isolates the cost of the Python code.
+    """
+
+    def __init__(self, config_filename=None, config_overrides=None):
+        self.tasks = {}
+
+    def _store(self, task):
+        task.setdefault('uuid', f'uuid-{len(self.tasks)}')
+        task['id'] = len(self.tasks) + 1
+        self.tasks[task['uuid']] = task
+        return dict(task)
+
+    def filter_tasks(self, filter_dict):
+        if 'or' in filter_dict:
+            uuids = [v for _, v in filter_dict['or']]
+            return [dict(self.tasks[u]) for u in uuids if u in self.tasks]
+        return [dict(t) for t in self.tasks.values() if 'todoist_id' in t]
+
+    def task_add(self, description, tags=None, **kw):
+        kw = {k: v for k, v in kw.items() if v is not None}
+        kw['todoist_id'] = str(kw['todoist_id'])
+        return self._store(dict(kw, description=description, tags=tags or [],
+                                status=gateways.TW_STATUS_PENDING))
+
+    def task_update(self, task):
+        self.tasks[task['uuid']].update(task)
+        return task['id'], dict(self.tasks[task['uuid']])
+
+    def get_task(self, uuid):
+        task = self.tasks.get(uuid)
+        return (task['id'], dict(task)) if task else (None, {})
+
+    def _execute(self, *args):
+        # Only `task <uuids> delete`, by `revert`, and `task <uuid> done`
+        # are run directly
+        status = {
+            'delete': gateways.TW_STATUS_DELETED,
+            'done': gateways.TW_STATUS_COMPLETED,
+        }[args[-1]]
+        for arg in args[:-1]:
+            if arg in self.tasks:
+                self.tasks[arg].update(status=status, id=0)
+        return '', ''
+
+
+class MemoryTaskWarrior(gateways.TaskWarrior):
+    """TaskWarrior gateway backed by a `MemoryClient`."""
+
+    def __init__(self, config_file):
+        self.client = MemoryClient()
+        self._index = None
+
+    def _execute_import(self, records):
+        for record in records:
+            self.client._store(dict(record))
@@ -0,0 +1,34 @@
+""" Date Micro-benchmark
+
+Compares parsing Todoist dates with `datetime.fromisoformat` against
+`dateutil`. Not collected by pytest; run it directly:
+
+    $ python -m tests.bench_dates
+"""
+import timeit
+
+import dateutil.parser
+
+from todoist_taskwarrior import utils
+
+
+DATES = [
+    '2019-01-02T03:04:05Z',
+    '2019-01-02',
+    '2019-01-02T03:04:05',
+    '2019-01-02T03:04:05.123456Z',
+]
+
+
+def main(tasks=10000, repeat=5):
+    dates = DATES * (tasks // len(DATES))
+    for name, fn in [
+            ('dateutil', dateutil.parser.parse),
+            ('fromisoformat', utils._parse_iso_date)]:
+        best = min(timeit.repeat(
+            lambda: [fn(d) for d in dates], number=1, repeat=repeat))
+        print(f'{name:<14} {best * 1000:8.1f} ms for {len(dates)} dates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+""" Recur Micro-benchmark
+
+Compares parsing a realistic mix of Todoist recurrences with and without
+the cache. Not collected by pytest; run it directly:
+
+    $ python -m tests.bench_recur
+"""
+import random
+import timeit
+
+from todoist_taskwarrior import errors, utils
+
+
+STRINGS = [
+    'every day', 'every monday', 'every other week', 'every 2nd friday',
+    'every month', 'every 15th', 'every year', 'every weekday',
+    'every 3 hours', 'every day at 9:00', 'weekly', 'every mon,tues',
+]
+
+
+def parse_uncached(date_string):
+    """`parse_recur_string` without the cache."""
+    date_string = utils.normalize_recur_string(date_string)
+    result = utils._parse_normalized_recur.__wrapped__(date_string)
+    if not result:
+        raise errors.UnsupportedRecurrence(date_string)
+    return result
+
+
+def run(fn, strings):
+    for s in strings:
+        try:
+            fn(s)
+        except errors.UnsupportedRecurrence:
+            pass
+
+
+def main(tasks=10000, repeat=5):
+    strings = random.Random(0).choices(STRINGS, k=tasks)
+    for name, fn in [
+            ('uncached', parse_uncached),
+            ('cached', utils.parse_recur_string)]:
+        best = min(timeit.repeat(lambda: run(fn, strings), number=1, repeat=repeat))
+        print(f'{name:<10} {best * 1000:8.1f} ms for {tasks} tasks')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+""" Shared fixtures
+
+In-memory stand-ins for the taskw and Todoist clients used by the gateways.
+"""
+import pytest
+from taskw.utils import encode_task_value
+from todoist_taskwarrior import gateways
+
+
+class FakeTW:
+    """Minimal stand-in for the taskw client which counts exports."""
+
+    def __init__(self, config_filename=None, config_overrides=None):
+        self.tasks = []
+        self.exports = 0
+
+    def filter_tasks(self, filter_dict):
+        self.exports += 1
+        if 'or' in filter_dict:
+            uuids = {v for _, v in filter_dict['or']}
+            return [t for t in self.tasks if t['uuid'] in uuids]
+        tasks = [t for t in self.tasks if 'todoist_id' in t]
+        if 'status.not' in filter_dict:
+            tasks = [t for t in tasks if t['status'] != filter_dict['status.not']]
+        if 'project' in filter_dict:
+            project = filter_dict['project']
+            tasks = [t for t in tasks if (t.get('project') or '') == project
+                     or (t.get('project') or '').startswith(project + '.')]
+        if 'entry.after' in filter_dict:
+            after = encode_task_value('entry', filter_dict['entry.after'])
+            tasks = [t for t in tasks if t.get('entry', '') > after]
+        return tasks
+
+    def task_add(self, description, **kw):
+        task = dict(kw, description=description, status='pending',
+                    uuid=f'uuid-{len(self.tasks)}', id=len(self.tasks) + 1)
+        task['todoist_id'] = str(task['todoist_id'])
+        self.tasks.append(task)
+        return dict(task)
+
+    def task_update(self, task):
+        stored = next(t for t in self.tasks if t['uuid'] == task['uuid'])
+        stored.update(task)
+        return stored['id'], dict(stored)
+
+    def get_task(self, uuid):
+        stored = next((t for t in self.tasks if t['uuid'] == uuid), None)
+        return (stored['id'], dict(stored)) if stored else (None, {})
+
+    def _execute(self, *args):
+        """Run `task <uuids or ids> delete|done`, the only commands used
+        directly.
+        """
+        status = {'delete': 'deleted', 'done': 'completed'}[args[-1]]
+        refs = {a for a in args[:-1] if not a.startswith('rc.')}
+        for task in self.tasks:
+            if task['uuid'] in refs or str(task.get('id')) in refs:
+                task.update(status=status, id=0)
+        return '', ''
+
+
+class FakeItems:
+
+    def __init__(self, api):
+        self.api = api
+
+    def close(self, item_id):
+        self.api.queue.append({
+            'type': 'item_close',
+            'uuid': f'cmd-{len(self.api.queue)}-{item_id}',
+            'args': {'id': item_id},
+        })
+
+
+class FakeTodoistAPI:
+    """Stand-in for `TodoistAPI` which replays canned sync responses.
+
+    Commands are acknowledged as 'ok' unless a canned response says otherwise.
+    """
+
+    def __init__(self, token, api_endpoint=None, cache=None):
+        self.token = token
+        self.items = FakeItems(self)
+        self.sync_token = '*'
+        self.queue = []
+        self.responses = []
+        self.commands = []
+
+    def sync(self, commands=None):
+        response = self.responses.pop(0) if self.responses else {}
+        if isinstance(response, Exception):
+            raise response
+        if 'error' in response:
+            return response
+        if commands:
+            self.commands.extend(commands)
+            response.setdefault('sync_status', {})
+            for cmd in commands:
+                response['sync_status'].setdefault(cmd['uuid'], 'ok')
+        return response
+
+
+@pytest.fixture
+def td(monkeypatch, tmp_path):
+    monkeypatch.setattr(gateways, 'TodoistAPI', FakeTodoistAPI)
+    monkeypatch.setattr(gateways, 'TODOIST_CACHE', str(tmp_path))
+    return gateways.Todoist('token')
+
+
+@pytest.fixture
+def tw(monkeypatch):
+    monkeypatch.setattr(gateways, 'TW', FakeTW)
+    return gateways.TaskWarrior('~/.taskrc')
+
+
+@pytest.fixture
+def run_cli(monkeypatch, tmp_path, td, tw):
+    """Invoke the CLI with the `td` and `tw` gateways fixtures."""
+    from click.testing import CliRunner
+    from todoist_taskwarrior import cli, journal, recurrences
+
+    monkeypatch.setattr(
+        recurrences, 'RECURRENCES_FILE', str(tmp_path / 'recurrences.json'))
+    monkeypatch.setattr(journal, 'JOURNAL_FILE', str(tmp_path / 'journal.jsonl'))
+    monkeypatch.setattr(gateways, 'Todoist', lambda api_key, cache_dir=None: td)
+    monkeypatch.setattr(gateways, 'TaskWarrior', lambda config_file: tw)
+
+    def run(*args, input=None, api_key='token'):
+        options = ['--todoist-api-key', api_key] if api_key else []
+        result = CliRunner().invoke(
+            cli.cli, options + list(args),
+            obj=cli.Ctx(), input=input)
+        if result.exception and not isinstance(result.exception, SystemExit):
+            raise result.exception
+        return result
+    return run
@@ -0,0 +1,563 @@
+""" CLI Tests
+
+Runs commands end-to-end against the in-memory gateway clients.
+"""
+import itertools
+
+import pytest
+
+
+def make_item(tid, **kw):
+    item = {
+        'id': tid, 'content': f'task {tid}', 'project_id': 1, 'labels': [],
+        'priority': 1, 'date_added': '2019-01-01T10:00:00Z', 'checked': 0,
+    }
+    item.update(kw)
+    return item
+
+
+@pytest.fixture
+def account(td, tw):
+    td.state.projects = [{'id': 1, 'name': 'Inbox', 'parent_id': None}]
+    td.state.items = [make_item(i) for i in range(1, 6)]
+    td.state.items[1]['checked'] = 1
+    return td, tw
+
+
+@pytest.mark.parametrize('jobs', ['1', '4'])
+def test_migrate(account, run_cli, jobs):
+    td, tw = account
+    result = run_cli('migrate', '--no-sync', '--jobs', jobs)
+    assert 'Migration finished: 5 added, 0 updated, 0 unchanged, 1 closed' in result.output
+    assert tw.get_task(2)['status'] == 'completed'
+
+    # Nothing changed since, so the next run has nothing to do
+    result = run_cli('migrate', '--no-sync', '--jobs', jobs)
+    assert 'No tasks changed since the last migration' in result.output
+
+    td.state.items[0]['content'] = 'renamed'
+    result = run_cli('migrate', '--no-sync', '--full', '--jobs', jobs)
+    assert 'Migration finished: 0 added, 1 updated, 4 unchanged, 0 closed' in result.output
+    assert tw.get_task(1)['description'] == 'renamed'
+
+
+def test_migrate_reports_failed_writes(account, run_cli, monkeypatch):
+    td, tw = account
+
+    def task_add(description, **kw):
+        raise RuntimeError('task add failed')
+
+    monkeypatch.setattr(tw.client, 'task_add', task_add)
+    result = run_cli('migrate', '--no-sync', '--jobs', '2')
+    assert '5 tasks could not be written to Taskwarrior' in result.output
+    assert '5 failed' in result.output
+    assert len(td.changes['item_ids']) == 0 and td.changes['full']
+
+
+def test_migrate_reports_failed_imports(account, run_cli, monkeypatch):
+    td, tw = account
+
+    # Pretend `task import` accepts only task 1
+    def execute_import(records):
+        tw.client.tasks.extend(r for r in records if r['todoist_id'] == '1')
+
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    result = run_cli('migrate', '--no-sync', '--bulk', '--chunk-size', '2')
+    assert result.output.count('Importing chunk 1 of 1 (2 tasks)... FAILED') == 2
+    assert ' OK' not in result.output.split('Starting migration')[1]
+    assert '4 tasks could not be written to Taskwarrior' in result.output
+    assert '1 added, 0 updated, 0 unchanged, 0 closed, 4 failed' in result.output
+    assert td.changes['full']
+
+    # The next run retries them
+    monkeypatch.setattr(tw, '_execute_import', tw.client.tasks.extend)
+    result = run_cli('migrate', '--no-sync', '--bulk', '--chunk-size', '2')
+    assert 'Migration finished: 4 added, 0 updated, 1 unchanged' in result.output
+
+
+def test_unsupported_recurrence_prompts_once(account, run_cli):
+    td, tw = account
+    due = {'date': '2019-02-01', 'string': 'every mon, wed', 'is_recurring': True}
+    for item in td.state.items:
+        item['due'] = dict(due)
+
+    result = run_cli('migrate', '--no-sync', input='every week\n')
+    assert result.output.count('Set recurrence') == 1
+    assert {t['recur'] for t in tw.client.tasks} == {'weekly'}
+
+    # The answer is remembered by later runs
+    td.state.items = list(td.state.items) + [make_item(6, due=dict(due))]
+    result = run_cli('migrate', '--no-sync', '--full', '--non-interactive')
+    assert 'Set recurrence' not in result.output
+    assert tw.get_task(6)['recur'] == 'weekly'
+
+
+def test_invalid_recurrences_file(account, run_cli, tmp_path):
+    td, tw = account
+    (tmp_path / 'recurrences.json').write_text('{"every mon, wed": "week')
+    td.state.items[0]['due'] = {
+        'date': '2019-02-01', 'string': 'every mon, wed', 'is_recurring': True}
+
+    result = run_cli('migrate', '--no-sync', input='every week\n')
+    assert 'Ignoring invalid recurrences file' in result.output
+    assert 'Migration finished: 5 added' in result.output
+    assert tw.get_task(1)['recur'] == 'weekly'
+
+
+def test_non_interactive_skips_unsupported_recurrences(account, run_cli):
+    td, tw = account
+    for item, string in zip(td.state.items, ['every mon, wed'] * 2 + ['every 3rd, 5th']):
+        item['due'] = {'date': '2019-02-01', 'string': string, 'is_recurring': True}
+
+    result = run_cli('migrate', '--no-sync', '--non-interactive')
+    assert 'Set recurrence' not in result.output
+    assert '3 tasks were skipped because of unsupported recurrences' in result.output
+    assert "'every mon, wed' (2 tasks)" in result.output
+    assert "'every 3rd, 5th' (1 tasks)" in result.output
+    assert 'Migration finished: 2 added' in result.output
+    assert [tw.get_task(i) for i in (1, 2, 3)] == [None] * 3
+    assert td.changes['full']
+
+
+@pytest.mark.parametrize('args', [['--jobs', '1'], ['--bulk', '--chunk-size', '2']])
+def test_migrate_streams_writes(account, run_cli, monkeypatch, args):
+    from todoist_taskwarrior import cli
+    td, tw = account
+    events = []
+
+    map_to_tw = cli.map_to_tw
+    def mapped(ctx, task, *args):
+        events.append(('map', task['id']))
+        return map_to_tw(ctx, task, *args)
+
+    add_task = tw.add_task
+    def added(data):
+        events.append(('write', data.tid))
+        return add_task(data)
+
+    def execute_import(records):
+        events.extend(('write', int(r['todoist_id'])) for r in records)
+        tw.client.tasks.extend(records)
+
+    monkeypatch.setattr(cli, 'map_to_tw', mapped)
+    monkeypatch.setattr(tw, 'add_task', added)
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    result = run_cli('migrate', '--no-sync', *args)
+    assert 'Migration finished: 5 added' in result.output
+
+    # The first tasks are written before the last one is even mapped
+    assert events.index(('write', 1)) < events.index(('map', 5))
+
+
+def test_migrate_filters(account, run_cli):
+    td, tw = account
+    result = run_cli('migrate', '--no-sync', '--filter-unchecked',
+                     '--filter-task-id', '3')
+    assert 'Migration finished: 1 added' in result.output
+
+    result = run_cli('migrate', '--no-sync', '--full', '--filter-checked')
+    assert 'Migration finished: 1 added, 0 updated, 0 unchanged, 1 closed' in result.output
+    assert [t['todoist_id'] for t in tw.client.tasks] == ['3', '2']
+
+
+def test_map_to_tw_model(account):
+    from todoist.models import Item
+    from todoist_taskwarrior import cli, models
+    td, tw = account
+    ctx = cli.Ctx()
+    ctx.obj = ctx
+    ctx.td, ctx.recurrences = td, {}
+
+    # Todoist models have no `get()`, and the item has no 'due' key
+    data = cli.map_to_tw(ctx, Item(make_item(1, priority=4), td.todoist), {}, {})
+    assert data == models.MappedTask(
+        1, 'task 1', project='Inbox', tags=[], priority='H',
+        entry='2019-01-01T10:00:00+00:00')
+
+
+def test_migrate_uses_state(account, run_cli):
+    td, tw = account
+    run_cli('migrate', '--no-sync')
+
+    # Unchanged tasks are decided without exporting from Taskwarrior
+    tw._index, tw.client.exports = None, 0
+    result = run_cli('migrate', '--no-sync', '--full')
+    assert '0 added, 0 updated, 5 unchanged, 0 closed' in result.output
+    assert tw.client.exports == 0
+
+    td.state.items[0]['content'] = 'renamed'
+    result = run_cli('migrate', '--no-sync', '--full')
+    assert '0 added, 1 updated, 4 unchanged, 0 closed' in result.output
+    assert tw.client.exports == 1
+
+
+def test_migrate_follows_projects_and_maps(account, run_cli):
+    td, tw = account
+    run_cli('migrate', '--no-sync')
+
+    # A renamed project changes the tasks in it, which the delta doesn't list
+    td.todoist.responses = [{'projects': [
+        {'id': 1, 'name': 'Home', 'parent_id': None}]}]
+    result = run_cli('migrate')
+    assert '0 added, 4 updated, 1 unchanged, 0 closed' in result.output
+    assert tw.get_task(1)['project'] == 'Home'
+
+    # Other maps than those of the last run require a full pass
+    result = run_cli('migrate', '--no-sync', '--map-project', 'Home=house')
+    assert '0 added, 4 updated, 1 unchanged, 0 closed' in result.output
+    assert tw.get_task(1)['project'] == 'house'
+    result = run_cli('migrate', '--no-sync', '--map-project', 'Home=house')
+    assert 'No tasks changed since the last migration' in result.output
+
+
+def test_interrupted_migration_rebuilds_state(account, run_cli, monkeypatch):
+    td, tw = account
+    add_task = tw.add_task
+    def add_or_fail(data):
+        if data.tid == 4:
+            raise RuntimeError('interrupted')
+        return add_task(data)
+
+    monkeypatch.setattr(tw, 'add_task', add_or_fail)
+    with pytest.raises(RuntimeError):
+        run_cli('migrate', '--no-sync')
+    monkeypatch.setattr(tw, 'add_task', add_task)
+
+    # The tasks added before the failure are found again, not duplicated
+    tw._index = None
+    result = run_cli('migrate', '--no-sync', '--full')
+    assert 'Rebuilding the local state' in result.output
+    assert '2 added, 0 updated, 3 unchanged, 0 closed' in result.output
+    assert len(tw.client.tasks) == 5
+
+
+def test_verify(account, run_cli):
+    td, tw = account
+    run_cli('migrate', '--no-sync')
+    tw.client.tasks.pop()
+
+    tw._index = None
+    result = run_cli('verify')
+    assert 'State rebuilt: 4 linked tasks (0 added, 1 removed, 0 changed)' in result.output
+
+
+def test_install_hook(account, run_cli, tmp_path):
+    import os, stat
+    hooks = tmp_path / 'hooks'
+    run_cli('install-hook', '--hooks-dir', str(hooks))
+    hook = hooks / 'on-modify.todoist-taskwarrior'
+    assert os.stat(hook).st_mode & stat.S_IXUSR
+    assert '-m todoist_taskwarrior.journal' in hook.read_text()
+    assert (tmp_path / 'journal.jsonl').exists()
+
+    run_cli('remove-hook', '--hooks-dir', str(hooks))
+    assert not hook.exists() and not (tmp_path / 'journal.jsonl').exists()
+
+
+@pytest.mark.parametrize('python', [None, '/nonexistent/python'])
+def test_installed_hook_runs_anywhere(account, run_cli, tmp_path, monkeypatch,
+                                      python):
+    import json, subprocess, sys
+    if python:
+        monkeypatch.setattr(sys, 'executable', python)
+    hooks = tmp_path / 'hooks'
+    run_cli('install-hook', '--hooks-dir', str(hooks))
+    original = {'uuid': 'a', 'todoist_id': '1', 'status': 'pending'}
+    modified = dict(original, status='completed')
+    stdin = f'{json.dumps(original)}\n{json.dumps(modified)}\n'
+
+    # TaskWarrior runs hooks from wherever `task` is run
+    monkeypatch.delenv('PYTHONPATH', raising=False)
+    result = subprocess.run(
+        [str(hooks / 'on-modify.todoist-taskwarrior')], input=stdin,
+        capture_output=True, text=True, cwd=str(tmp_path))
+    assert result.returncode == 0
+    assert json.loads(result.stdout.splitlines()[0]) == modified
+
+    # A failing hook still lets the modification through
+    journaled = (tmp_path / 'journal.jsonl').read_text()
+    assert bool(journaled) != bool(python)
+
+
+def test_sync_pushes_journal(account, run_cli, tmp_path):
+    from todoist_taskwarrior import journal
+    td, tw = account
+    j = journal.Journal(str(tmp_path / 'journal.jsonl'))
+    for tid, status in [(1, 'completed'), (3, 'completed'), (3, 'pending'), (4, 'completed')]:
+        j.append({'todoist_id': str(tid), 'status': status})
+    td.todoist.responses = [{'sync_status': {'cmd-1-4': {'error': 'rejected'}}}]
+
+    result = run_cli('sync', '--no-sync', '--no-taskw')
+    assert [c['args']['id'] for c in td.todoist.commands] == [1, 4]
+    assert 'Failed to close Todoist task (todoist_id=4)' in result.output
+    assert tw.client.exports == 0
+
+    # The rejected close is retried by the next sync
+    with j.drain() as entries:
+        assert [e['todoist_id'] for e in entries] == ['4']
+
+
+def test_watch(account, run_cli, monkeypatch):
+    td, tw = account
+    run_cli('migrate', '--no-sync')
+
+    # Two cycles on the interval, the second a cheap no-op
+    tw._index, tw.client.exports = None, 0
+    result = run_cli('watch', '--interval', '0.01', '--cycles', '2')
+    assert result.output.count('No tasks changed since the last migration') == 2
+    assert 'Stopped watching after 2 cycles' in result.output
+    assert tw.client.exports == 1
+
+    # TaskWarrior data changed by others between interval cycles
+    mtimes = itertools.chain([1, 1, 1], itertools.repeat(2))
+    monkeypatch.setattr(tw, 'data_mtime', lambda: next(mtimes))
+    tw.client.tasks[0]['status'] = 'completed'
+    result = run_cli('watch', '--interval', '3600', '--poll', '0.01', '--cycles', '2')
+    assert 'Local changes found' in result.output
+    assert [c['args']['id'] for c in td.todoist.commands] == [1]
+
+    # Polling or syncing without a pause would keep a CPU busy
+    result = run_cli('watch', '--poll', '0')
+    assert result.exit_code == 2
+    assert 'Invalid value for "--poll": 0.0 is not a positive number' in result.output
+    result = run_cli('watch', '--interval', '0')
+    assert result.exit_code == 2
+    assert 'Invalid value for "--interval": 0.0 is not a positive number' in result.output
+
+
+def test_watch_flushes_before_sleeping(account, run_cli, monkeypatch):
+    import threading
+    from todoist_taskwarrior import io
+    run_cli('migrate', '--no-sync')
+
+    buffered = []
+
+    class Event(threading.Event):
+        def wait(self, timeout=None):
+            buffered.append(list(io._buffer))
+            return super().wait(timeout)
+
+    monkeypatch.setattr(threading, 'Event', Event)
+    # Everything of a cycle is written within the flush interval
+    monkeypatch.setattr(io, 'FLUSH_INTERVAL', 3600)
+    result = run_cli('watch', '--interval', '0.01', '--cycles', '2')
+    assert result.exit_code == 0
+    assert len(buffered) >= 2 and not any(buffered)
+
+
+def test_output_levels(account, run_cli, tmp_path):
+    import json
+    events = tmp_path / 'events.jsonl'
+    result = run_cli('--output', 'summary', '--events', str(events),
+                     'migrate', '--no-sync')
+    assert result.output.splitlines()[-1] == (
+        'Migration finished: 5 added, 0 updated, 0 unchanged, 1 closed')
+    assert 'Task 1 of 5' not in result.output
+    assert 'Importing' not in result.output
+
+    lines = [json.loads(line) for line in events.read_text().splitlines()]
+    written = [e['todoist_id'] for e in lines if e['event'] == 'task_written']
+    assert sorted(written) == [1, 2, 3, 4, 5]
+    assert lines[-1]['event'] == 'message'
+    finished = next(e for e in lines if e['event'] == 'migration_finished')
+    assert (finished['added'], finished['closed']) == (5, 1)
+
+
+def test_plan_and_apply(account, run_cli, monkeypatch, tmp_path):
+    td, tw = account
+
+    def execute_import(records):
+        for record in records:
+            stored = next((t for t in tw.client.tasks if t['uuid'] == record['uuid']), None)
+            if stored is None:
+                tw.client.tasks.append(dict(record))
+            else:
+                stored.clear()
+                stored.update(record)
+
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    plan = str(tmp_path / 'plan.gz')
+
+    result = run_cli('plan', '--no-sync', plan)
+    assert '5 to add, 0 to update, 1 to close, 0 to close on Todoist' in result.output
+    assert tw.client.tasks == []
+
+    result = run_cli('apply', plan)
+    assert '5 added, 0 updated, 1 closed, 0 closed on Todoist' in result.output
+    assert tw.get_task(2)['status'] == 'completed'
+    assert td.changes == {
+        'full': False, 'item_ids': [], 'maps': {'project': {}, 'tag': {}}}
+
+    # Applying again doesn't duplicate tasks
+    result = run_cli('apply', plan)
+    assert '0 added, 0 updated, 0 closed' in result.output
+    assert len(tw.client.tasks) == 5
+
+    td.state.items[0]['content'] = 'renamed'
+    td.state.items[3]['content'] = 'renamed'
+    tw.get_task(3)['status'] = 'completed'
+    result = run_cli('plan', '--no-sync', '--full', plan)
+    assert '0 to add, 2 to update, 0 to close, 1 to close on Todoist' in result.output
+
+    # Task 4 changed in TaskWarrior since planned
+    tw.get_task(4)['modified'] = '20190102T000000Z'
+    result = run_cli('apply', plan)
+    assert 'Changed since planned, skipped (todoist_id=4)' in result.output
+    assert '0 added, 1 updated, 0 closed, 1 closed on Todoist, 1 changed since planned' in result.output
+    assert tw.get_task(1)['description'] == 'renamed'
+    assert tw.get_task(4)['description'] == 'task 4'
+    assert [c['args']['id'] for c in td.todoist.commands] == [3]
+
+    result = run_cli('plan', '--no-sync', '--full', plan)
+    assert '0 to add, 1 to update, 0 to close, 0 to close on Todoist' in result.output
+
+
+def test_apply_keeps_tasks_changed_since_planned(account, run_cli, monkeypatch,
+                                                tmp_path):
+    td, tw = account
+
+    def execute_import(records):
+        for record in records:
+            stored = next(t for t in tw.client.tasks if t['uuid'] == record['uuid'])
+            stored.update(record)
+
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    plan = str(tmp_path / 'plan.gz')
+    run_cli('migrate', '--no-sync')
+
+    td.todoist.responses = [{'items': [make_item(1, content='v1')]}]
+    run_cli('synchronize')
+    run_cli('plan', '--no-sync', plan)
+
+    # Synced again before the plan is applied
+    td.todoist.responses = [{'items': [make_item(1, content='v2')]}]
+    run_cli('synchronize')
+    result = run_cli('apply', plan)
+    assert '0 added, 1 updated' in result.output
+    assert td.changes['item_ids'] == [1]
+
+    result = run_cli('migrate', '--no-sync')
+    assert 'Migration finished: 0 added, 1 updated' in result.output
+    assert tw.get_task(1)['description'] == 'v2'
+
+
+def test_apply_invalid_plan(account, run_cli, tmp_path):
+    plan = tmp_path / 'plan.gz'
+    plan.write_bytes(b'not a plan')
+    result = run_cli('apply', str(plan))
+    assert result.exit_code == 1
+    assert f'Invalid plan {plan}' in result.output
+
+
+def test_apply_plan_of_other_account(account, run_cli, tmp_path):
+    td, tw = account
+    plan = str(tmp_path / 'plan.gz')
+    run_cli('plan', '--no-sync', plan)
+
+    result = run_cli('apply', plan, api_key='other')
+    assert result.exit_code == 1
+    assert 'written for another Todoist account or TaskWarrior config' in result.output
+    result = run_cli('--tw-config-file', str(tmp_path / '.taskrc'), 'apply', plan)
+    assert result.exit_code == 1
+    assert tw.client.tasks == []
+
+
+def test_revert(account, run_cli):
+    td, tw = account
+    run_cli('migrate', '--no-sync')
+    tw.client.tasks[0].update(project='Work.Errands')
+    tw.client.tasks[1].update(entry='20190301T000000Z')
+    tw.client.tasks.append({'uuid': 'other', 'status': 'pending'})
+
+    result = run_cli('revert', input='n\n')
+    assert 'Are you sure you want to delete 5 tasks?' in result.output
+    assert 'Aborted' in result.output
+
+    result = run_cli('revert', '--project', 'Work', '--yes')
+    assert 'Deleted 1 tasks' in result.output
+    result = run_cli('revert', '--since', '2019-02-01', '--yes')
+    assert 'Deleted 1 tasks' in result.output
+    assert [t['status'] for t in tw.client.tasks[:2]] == ['deleted'] * 2
+
+    result = run_cli('revert', input='y\n')
+    assert 'Deleted 3 tasks' in result.output
+    assert tw.client.tasks[-1]['status'] == 'pending'
+    result = run_cli('revert', '--yes')
+    assert 'No migrated tasks found' in result.output
+
+    # The deleted tasks aren't migrated again
+    result = run_cli('migrate', '--no-sync', '--full')
+    assert 'Migration finished: 0 added, 0 updated, 5 unchanged' in result.output
+    result = run_cli('verify')
+    result = run_cli('migrate', '--no-sync', '--full')
+    assert 'Migration finished: 0 added, 0 updated, 5 unchanged' in result.output
+
+
+def test_account(account, run_cli, tmp_path, monkeypatch):
+    import json
+    td, tw = account
+    accounts_file = tmp_path / 'accounts.json'
+    accounts_file.write_text(json.dumps({
+        'work': {'api_key_env': 'WORK_KEY', 'map_project': {'Inbox': 'work'}},
+    }))
+    monkeypatch.setenv('WORK_KEY', 'secret')
+    monkeypatch.setenv('TODOIST_API_KEY', 'other')
+
+    result = run_cli('--accounts-file', str(accounts_file), '--account', 'work',
+                     'migrate', '--no-sync', '--map-tag', 'a=b', api_key=None)
+    assert 'Migration finished: 5 added' in result.output
+    assert {t['project'] for t in tw.client.tasks} == {'work'}
+
+    result = run_cli('--accounts-file', str(accounts_file), '--account', 'home',
+                     'migrate', api_key=None)
+    assert result.exit_code == 2
+    assert 'Invalid profile home: no such profile' in result.output
+
+    # The options the account sets can't be given as well
+    result = run_cli('--accounts-file', str(accounts_file), '--account', 'work',
+                     'migrate')
+    assert result.exit_code == 2
+    assert "--account can't be combined with --todoist-api-key" in result.output
+
+
+def test_clean(account, run_cli, tmp_path):
+    td, tw = account
+    td.cache_dir = str(tmp_path / 'cache') + '/'
+    td.todoist.responses = [{'sync_token': 'abc', 'items': [make_item(6)]}]
+    run_cli('synchronize')
+    (tmp_path / 'cache' / 'work').mkdir()
+
+    result = run_cli('clean', '--yes')
+    assert 'Removing file' in result.output
+    assert [p.name for p in (tmp_path / 'cache').iterdir()] == ['work']
+    assert 'Kept ' in result.output
+
+    (tmp_path / 'cache' / 'work').rmdir()
+    run_cli('clean', '--yes')
+    assert not (tmp_path / 'cache').exists()
+
+
+@pytest.mark.parametrize('output', ['tasks', 'summary'])
+def test_sync_all_accounts(account, run_cli, tmp_path, monkeypatch, output):
+    import json
+    accounts_file = tmp_path / 'accounts.json'
+    accounts_file.write_text(json.dumps({
+        'home': {'api_key_env': 'HOME_KEY', 'cache_dir': str(tmp_path / 'home')},
+        'work': {'api_key_env': 'WORK_KEY', 'cache_dir': str(tmp_path / 'work')},
+        'broken': {'api_key_env': 'MISSING_KEY'},
+    }))
+    monkeypatch.setenv('HOME_KEY', 'home-key')
+    monkeypatch.setenv('WORK_KEY', 'work-key')
+    monkeypatch.delenv('MISSING_KEY', raising=False)
+
+    result = run_cli('--output', output, '--accounts-file', str(accounts_file),
+                     'sync', '--no-sync', '--all-accounts', '--jobs', '2',
+                     api_key=None)
+    assert result.exit_code == 1
+    assert ('Account home: 5 added, 0 updated, 0 unchanged, 1 closed, '
+            '0 closed on Todoist') in result.output
+    assert '[work] Migration finished: 5 added' in result.output
+    assert 'Account broken failed: ' in result.output
+    assert '$MISSING_KEY is not set' in result.output
+    assert ('Synced 2 of 3 accounts in ') in result.output
+    assert ': 10 added, 0 updated, 0 unchanged, 2 closed' in result.output
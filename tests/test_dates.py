@@ -0,0 +1,33 @@
+""" Date Tests
+
+Tests converting Todoist dates to Taskwarrior ones.
+"""
+import dateutil.parser
+import pytest
+from datetime import timedelta
+from todoist_taskwarrior import utils
+
+
+@pytest.mark.parametrize('date', [
+    '2016-12-01',
+    '2016-12-01T12:00:00',
+    '2016-12-01T12:00:00Z',
+    '2016-12-01T12:00:00.123456Z',
+    '2016-12-01T12:00:00+02:00',
+    'Fri 26 Sep 2014 08:25:05 +0000',
+])
+def test_parse_date_matches_dateutil(date):
+    expected = dateutil.parser.parse(date)
+    assert utils.parse_date(date) == expected.isoformat()
+    assert utils.parse_date(date, timedelta(days=1)) == (expected + timedelta(days=1)).isoformat()
+
+
+def test_parse_date_empty():
+    assert utils.parse_date(None) == None
+    assert utils.parse_date('') == None
+
+
+def test_parse_due():
+    assert utils.parse_due(None) == None
+    assert utils.parse_due({'date': '2016-12-01'}) == '2016-12-02T00:00:00'
+    assert utils.parse_due({'date': '2016-12-01T12:00:00Z'}) == '2016-12-02T12:00:00+00:00'
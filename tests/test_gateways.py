@@ -0,0 +1,455 @@
+""" Gateway Tests
+
+Tests the Todoist and TaskWarrior gateways against in-memory clients.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+from taskw.exceptions import TaskwarriorError
+from todoist.api import TodoistAPI
+from todoist_taskwarrior import errors, gateways, models
+
+
+def make_data(tid, **kw):
+    kw.setdefault('description', f'task {tid}')
+    kw.setdefault('tags', [])
+    return models.MappedTask(tid, **kw)
+
+
+def test_index_is_loaded_once(tw):
+    tw.client.tasks = [
+        {'uuid': 'a', 'todoist_id': '1', 'status': 'pending'},
+        {'uuid': 'b', 'todoist_id': '2', 'status': 'completed'},
+        {'uuid': 'c', 'status': 'pending'},
+    ]
+    assert tw.get_task(1)['uuid'] == 'a'
+    assert tw.get_task('2')['uuid'] == 'b'
+    assert tw.get_task(3) is None
+    assert tw.client.exports == 1
+
+
+def test_index_follows_writes(tw):
+    tw.add_task(make_data(10))
+    task = tw.get_task(10)
+    assert task['status'] == 'pending'
+
+    tw.update(task, make_data(10, description='renamed'))
+    assert tw.get_task(10)['description'] == 'renamed'
+
+    tw.close(tw.get_task(10))
+    assert tw.get_task(10)['status'] == 'completed'
+    assert tw.client.exports == 1
+
+
+def test_close_by_uuid(tw):
+    tw.client.tasks = [
+        {'uuid': u, 'id': n, 'todoist_id': str(n), 'status': 'pending'}
+        for n, u in enumerate(['a', 'b', 'c'], 1)
+    ]
+    task = tw.get_task(2)
+
+    # Another `task` process completes task 1 and renumbers the others
+    tw.client._execute('a', 'done')
+    for n, t in enumerate(tw.client.tasks[1:], 1):
+        t['id'] = n
+
+    assert tw.close(task)['status'] == 'completed'
+    assert [t['status'] for t in tw.client.tasks] == [
+        'completed', 'completed', 'pending']
+    assert tw.get_task(2)['status'] == 'completed'
+
+
+def test_config_sections(tw, tmp_path):
+    tw.client.config = {'hooks': '1', 'data': {'location': str(tmp_path)}}
+    (tmp_path / 'pending.data').write_text('')
+    assert tw.hooks_dir() == str(tmp_path / 'hooks')
+    assert tw.data_mtime() == (tmp_path / 'pending.data').stat().st_mtime
+
+    tw.client.config = {'hooks': {'location': str(tmp_path)}, 'data': '1'}
+    assert tw.hooks_dir() == str(tmp_path)
+
+    tw.client.config = {}
+    assert tw.hooks_dir() == os.path.expanduser('~/.task/hooks')
+
+
+def test_import_record():
+    record = gateways._import_record(make_data(
+        7, project="'Work Errands'", tags=['a', None], priority='H',
+        entry='2019-01-02T03:04:05+00:00', due='2019-02-01T00:00:00+00:00',
+        recur='weekly'))
+    assert record['todoist_id'] == '7'
+    assert record['project'] == 'Work Errands'
+    assert record['tags'] == ['a']
+    assert record['entry'] == '20190102T030405Z'
+    assert record['due'] == '20190201T000000Z'
+    assert record['recur'] == 'weekly'
+    assert record['status'] == 'recurring'
+    assert len(record['uuid']) == 36
+
+
+def test_import_tasks_in_chunks(tw, monkeypatch):
+    calls = []
+
+    def execute_import(records):
+        calls.append(records)
+        # Pretend the task with todoist_id 3 is rejected by Taskwarrior.
+        tw.client.tasks.extend(r for r in records if r['todoist_id'] != '3')
+
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    tw.client.tasks = [{'uuid': 'x', 'todoist_id': '1', 'status': 'pending'}]
+
+    data = [make_data(tid) for tid in (1, 2, 3, 4, 5, 2)]
+    results = tw.import_tasks(data, chunk_size=2)
+
+    assert [len(c) for c in calls] == [2, 2]
+    assert [(d.tid, bool(t)) for d, t in results] == [
+        (2, True), (3, False), (4, True), (5, True)]
+    assert tw.get_task(4)['status'] == 'pending'
+    assert tw.get_task(3) is None
+
+    # Already imported tasks are skipped on a second run
+    assert [d.tid for d, _ in tw.import_tasks(data, chunk_size=2)] == [3]
+
+
+def test_write_tasks(tw, monkeypatch):
+    def execute_import(records):
+        # Pretend the change to task 2 is rejected by Taskwarrior.
+        for record in records:
+            if record['todoist_id'] != '2':
+                stored = next(t for t in tw.client.tasks if t['uuid'] == record['uuid'])
+                stored.clear()
+                stored.update(record)
+
+    monkeypatch.setattr(tw, '_execute_import', execute_import)
+    tw.client.tasks = [
+        {'uuid': f'u{tid}', 'id': tid, 'todoist_id': str(tid), 'status': 'pending',
+         'description': f'task {tid}', 'project': 'Inbox', 'urgency': 1.0}
+        for tid in (1, 2, 3)
+    ]
+    changes = [
+        (tw.get_task(1), make_data(1, description='renamed'), False),
+        (tw.get_task(2), make_data(2, description='renamed'), False),
+        (tw.get_task(3), None, True),
+    ]
+    results = tw.write_tasks(changes, chunk_size=2)
+
+    assert [bool(t) for t in results] == [True, False, True]
+    assert tw.get_task(1)['description'] == 'renamed'
+    assert 'project' not in tw.get_task(1) and 'urgency' not in tw.get_task(1)
+    assert tw.get_task(3)['status'] == 'completed' and tw.get_task(3)['end']
+    assert tw.get_task(3)['project'] == 'Inbox'
+
+
+def test_delete_tasks(tw, monkeypatch):
+    tw.client.tasks = [
+        {'uuid': f'u{tid}', 'todoist_id': str(tid), 'status': 'pending'}
+        for tid in range(1, 6)
+    ]
+    execute = tw.client._execute
+
+    def fail_on_task_4(*args):
+        if 'u4' in args:
+            # Pretend Taskwarrior fails after deleting the first task.
+            execute(*args[:3], 'delete')
+            raise TaskwarriorError(args, 'failed', '', 1)
+        return execute(*args)
+
+    monkeypatch.setattr(tw.client, '_execute', fail_on_task_4)
+    tasks = tw.get_migrated_tasks()
+    results = [
+        ([t['uuid'] for t in deleted], [t['uuid'] for t in failed], bool(error))
+        for deleted, failed, error in tw.delete_tasks(tasks, chunk_size=2)
+    ]
+    assert results == [
+        (['u1', 'u2'], [], False),
+        (['u3'], ['u4'], True),
+        (['u5'], [], False),
+    ]
+    assert tw.get_task(1)['status'] == 'deleted'
+    assert tw.get_task(4)['status'] == 'pending'
+    assert [t['uuid'] for t in tw.get_migrated_tasks()] == ['u4']
+
+
+def test_is_changed(tw):
+    task = {
+        'description': 'task 1',
+        'project': 'Work Errands',
+        'due': '20190201T000000Z',
+    }
+    data = make_data(1, project="'Work Errands'", due='2019-02-01T00:00:00+00:00')
+    assert not tw.is_changed(task, data)
+    assert tw.is_changed(task, data.replace(description='other'))
+    assert tw.is_changed(task, data.replace(due='2019-02-02T00:00:00+00:00'))
+    assert tw.is_changed(task, data.replace(project=None))
+    assert not tw.is_changed({'description': 'task 1'}, make_data(1, project=''))
+
+
+def test_incremental_changes(td):
+    item = lambda i: {'id': i, 'project_id': 1}
+    td.todoist.responses = [
+        {'full_sync': True, 'items': [item(1), item(2)]},
+        {'full_sync': False, 'items': [item(3)]},
+    ]
+
+    # Everything is processed after the first sync
+    td.sync()
+    assert [t['id'] for t in td.get_tasks(changed_only=True)] == [1, 2]
+    td.mark_processed()
+    assert td.get_tasks(changed_only=True) == []
+
+    # Only the delta afterwards, and the state survives a restart
+    td.sync()
+    td = gateways.Todoist('token')
+    assert [t['id'] for t in td.get_tasks(changed_only=True)] == [3]
+    assert len(td.get_tasks()) == 3
+
+    td.mark_processed([3])
+    assert td.get_tasks(changed_only=True) == []
+
+
+def test_project_and_label_changes(td):
+    td.state.projects = [
+        {'id': 1, 'name': 'Work', 'parent_id': None},
+        {'id': 2, 'name': 'Errands', 'parent_id': 1},
+        {'id': 3, 'name': 'Home', 'parent_id': None},
+    ]
+    td.state.items = [
+        {'id': 1, 'project_id': 1, 'labels': []},
+        {'id': 2, 'project_id': 2, 'labels': []},
+        {'id': 3, 'project_id': 3, 'labels': [7]},
+        {'id': 4, 'project_id': 3, 'labels': []},
+    ]
+    td.mark_processed()
+
+    # Tasks in moved projects and their subprojects, and with renamed labels
+    td.todoist.responses = [{
+        'projects': [{'id': 1, 'name': 'Work', 'parent_id': 3}],
+        'labels': [{'id': 7, 'name': 'renamed'}],
+    }]
+    td.sync()
+    assert td.changes['item_ids'] == [1, 2, 3]
+
+    # Other maps than those last processed with require a full pass
+    td.use_maps({}, {})
+    td.mark_processed()
+    td.use_maps({}, {})
+    assert not td.changes['full']
+    td.use_maps({'Home': 'house'}, {})
+    assert td.changes['full']
+
+
+def test_state_from_snapshot(td, tmp_path):
+    td.todoist.responses = [{'sync_token': 'abc', 'items': [
+        {'id': i, 'project_id': 1 + i % 2, 'checked': 0} for i in range(1, 6)]}]
+    td.sync()
+    td.close_task(2)
+    td.commit()
+
+    # A restart reads the items and the sync token back from the snapshot
+    td = gateways.Todoist('token')
+    assert td.todoist.sync_token == 'abc'
+    assert td.count_tasks(filter_proj_id=2, checked=False) == 3
+    assert td.state.items._block == (None, None)
+    assert [t['id'] for t in td.iter_tasks(filter_proj_id=2, checked=False)] == [1, 3, 5]
+    assert td.get_task(2)['checked'] == 1
+
+    # A sync without changes leaves the snapshot alone
+    mtime = (tmp_path / 'token.snapshot').stat().st_mtime_ns
+    td.todoist.responses = [{'sync_token': 'abc'}]
+    td.sync()
+    assert not td.state.changed
+    assert (tmp_path / 'token.snapshot').stat().st_mtime_ns == mtime
+
+
+def test_client_cache_is_moved_to_snapshot(td, tmp_path):
+    (tmp_path / 'token.json').write_text(json.dumps({
+        'items': [{'id': 1, 'project_id': 1}],
+        'projects': [{'id': 1, 'name': 'Inbox', 'parent_id': None}],
+        'labels': [],
+    }))
+    (tmp_path / 'token.sync').write_text('abc')
+
+    assert [t['id'] for t in td.get_tasks()] == [1]
+    assert td.project_name_from_todoist(1, {}) == 'Inbox'
+    assert td.todoist.sync_token == 'abc'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['token.snapshot']
+
+
+def test_iter_tasks(td):
+    td.state.items = [
+        {'id': i, 'project_id': 1 + i % 2} for i in range(1, 6)]
+    tasks = td.iter_tasks(filter_proj_id=1)
+    assert not isinstance(tasks, list)
+    assert [t['id'] for t in tasks] == [2, 4]
+    assert td.count_tasks(filter_proj_id=2) == 3
+    assert td.count_tasks(filter_task_id=9) == 0
+
+
+def test_task_filters(td):
+    td.state.projects = [
+        {'id': 1, 'name': 'Work', 'parent_id': None},
+        {'id': 2, 'name': 'Errands', 'parent_id': 1},
+        {'id': 3, 'name': 'Shop', 'parent_id': 2},
+        {'id': 4, 'name': 'Home', 'parent_id': None},
+    ]
+    due = lambda date: {'date': date, 'string': date, 'is_recurring': False}
+    td.state.items = [
+        {'id': 1, 'project_id': 1, 'labels': [7], 'checked': 0, 'due': None},
+        {'id': 2, 'project_id': 2, 'labels': [], 'checked': 1,
+         'due': due('2019-03-01')},
+        {'id': 3, 'project_id': 3, 'labels': [7, 8], 'checked': 0,
+         'due': due('2019-02-01T10:00:00Z')},
+        {'id': 4, 'project_id': 4, 'labels': [8], 'checked': 0,
+         'due': due('2019-01-01')},
+    ]
+    ids = lambda **kw: [t['id'] for t in td.iter_tasks(**kw)]
+
+    assert ids(filter_task_id=3) == [3]
+    assert ids(filter_proj_id=1) == [1]
+    assert ids(filter_proj_id=1, subprojects=True) == [1, 2, 3]
+    assert ids(filter_label_id=7) == [1, 3]
+    assert ids(checked=True) == [2]
+    assert ids(checked=False) == [1, 3, 4]
+    assert ids(due_before=datetime(2019, 3, 1)) == [3, 4]
+    assert ids(due_after=datetime(2019, 1, 1), due_before=datetime(2019, 3, 2)) == [2, 3]
+    assert ids(filter_proj_id=1, subprojects=True, filter_label_id=8,
+               checked=False) == [3]
+    assert ids(filter_task_id=2, checked=False) == []
+
+    # The index follows syncs
+    td.todoist.responses = [{'items': [
+        {'id': 5, 'project_id': 3, 'labels': [7], 'checked': 0, 'due': None}]}]
+    td.sync()
+    assert ids(filter_label_id=7) == [1, 3, 5]
+
+
+def test_project_names(td):
+    td.state.projects = [
+        {'id': 1, 'name': 'Programming', 'parent_id': None},
+        {'id': 2, 'name': 'Open Source', 'parent_id': 1},
+        {'id': 3, 'name': 'Docs', 'parent_id': 2},
+        {'id': 4, 'name': 'Taxes', 'parent_id': None},
+    ]
+    mapping = {'Taxes': None}
+    assert td.project_name_from_todoist(1, mapping) == 'Programming'
+    assert td.project_name_from_todoist(3, mapping) == "'Programming.Open Source.Docs'"
+    assert td.project_name_from_todoist(4, mapping) is None
+    assert td.project_name_from_todoist(5, mapping) == ''
+    assert td.project_name_from_todoist(2, {'Programming.Open Source': 'oss'}) == 'oss'
+
+    # New projects from a sync invalidate the cache
+    td.todoist.responses = [{'projects': [{'id': 5, 'name': 'New', 'parent_id': 4}]}]
+    td.sync()
+    assert td.project_name_from_todoist(5, mapping) == 'Taxes.New'
+
+
+def test_tag_names(td):
+    td.state.labels = [
+        {'id': 1, 'name': 'books'},
+        {'id': 2, 'name': 'errands'},
+        {'id': 3, 'name': 'someday'},
+    ]
+    mapping = {'books': 'reading', 'someday': None}
+    assert td.tag_names_from_todoist([1, 2, 3, 4], mapping) == ['reading', 'errands']
+    assert td.tag_names_from_todoist([], mapping) == []
+    assert td.tag_names_from_todoist([3], {}) == ['someday']
+
+
+def test_lazy_client(td):
+    assert td._todoist is None
+    assert td.commit() == {}
+    assert td._todoist is not None
+
+
+def test_commit_in_batches(td):
+    td.state.items = [{'id': i, 'checked': 0} for i in range(5)]
+    td.todoist.responses = [
+        {'sync_status': {'cmd-1-1': {'error': 'Item not found'}}},
+        requests.ConnectionError('connection reset'),
+        {'error': 'Too many requests'},
+        {},
+    ]
+    for i in range(5):
+        td.close_task(i)
+
+    failed = td.commit(batch_size=3, backoff=0)
+    assert failed == {1: {'error': 'Item not found'}}
+    assert len(td.todoist.commands) == 5
+    assert td.todoist.queue == []
+    assert [i['checked'] for i in td.state.items] == [1, 0, 1, 1, 1]
+
+
+def test_commit_gives_up(td):
+    td.todoist.responses = [{'error': 'Service unavailable'}] * 3
+    td.close_task(1)
+    with pytest.raises(errors.TodoistSyncError):
+        td.commit(retries=2, backoff=0)
+
+
+def test_commit_keeps_failures_when_giving_up(td):
+    # The client can't merge an error string as a response
+    bad_response = TypeError('string indices must be integers')
+    td.todoist.responses = [
+        {'sync_status': {'cmd-0-1': {'error': 'Item not found'}}},
+        bad_response, {}, bad_response, bad_response,
+    ]
+    for i in range(1, 6):
+        td.close_task(i)
+
+    with pytest.raises(errors.TodoistSyncError) as e:
+        td.commit(batch_size=2, retries=1, backoff=0)
+    assert e.value.failed == {1: {'error': 'Item not found'}}
+    assert len(td.todoist.commands) == 4
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    """Minimal Todoist sync endpoint which rate limits every other request."""
+
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        commands = json.loads(parse_qs(body.decode())['commands'][0])
+        self.requests.append(commands)
+        if len(self.requests) % 2:
+            status, response = 429, {'error': 'Too many requests'}
+        else:
+            status, response = 200, {
+                'sync_token': str(len(self.requests)),
+                'sync_status': {c['uuid']: 'ok' for c in commands},
+                'items': [{'id': c['args']['id'], 'checked': 1} for c in commands],
+            }
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def test_commit_against_http_server(td, tmp_path):
+    server = HTTPServer(('127.0.0.1', 0), SyncHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        td._todoist = TodoistAPI(
+            'token',
+            api_endpoint=f'http://127.0.0.1:{server.server_port}',
+            cache=f'{tmp_path}/',
+        )
+        for i in range(5):
+            td.close_task(i)
+        assert td.commit(batch_size=2, backoff=0) == {}
+    finally:
+        server.shutdown()
+
+    # Each batch is rejected once, then accepted
+    assert [len(c) for c in SyncHandler.requests] == [2, 2, 2, 2, 1, 1]
+    assert [i['checked'] for i in td.state.items] == [1] * 5
+    assert td.changes['item_ids'] == [0, 1, 2, 3, 4]
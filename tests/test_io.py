@@ -0,0 +1,84 @@
+""" Output Tests """
+import io as _io
+import json
+
+import pytest
+from todoist_taskwarrior import io
+
+
+@pytest.fixture
+def output(monkeypatch):
+    io.flush()
+    out = _io.StringIO()
+    monkeypatch.setattr(io, 'cecho', lambda text, nl: out.write(io.unstyle(text)))
+    monkeypatch.setattr(io, 'FLUSH_INTERVAL', 3600)
+    yield out
+    io.configure()
+
+
+@pytest.mark.parametrize('level, lines', [
+    (io.LEVEL_TASKS, ['task', 'info', 'done', 'report']),
+    (io.LEVEL_PROGRESS, ['info', 'done', 'report']),
+    (io.LEVEL_SUMMARY, ['done', 'report']),
+])
+def test_levels(output, level, lines):
+    io.configure(level)
+    io.detail('task')
+    io.info('info')
+    io.important('done')
+    io.summary('report')
+    assert output.getvalue() == ''  # buffered
+    io.flush()
+    assert output.getvalue().splitlines() == lines
+
+
+def test_progress(output, monkeypatch):
+    monkeypatch.setattr(io, 'PROGRESS_LOG_INTERVAL', 0)
+    io.configure(io.LEVEL_PROGRESS)
+    progress = io.Progress(4, 'Migrating')
+    progress.advance()
+    progress.advance(3)
+    progress.close()
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith('Migrating [#####---------------] 1/4 (25%)')
+    assert lines[-1].startswith('Migrating [####################] 4/4 (100%)')
+    assert lines[-1].endswith('ETA --:--:--')
+
+
+def test_progress_keeps_open_lines(output, monkeypatch):
+    monkeypatch.setattr(io, 'PROGRESS_INTERVAL', 0)
+    io.configure(io.LEVEL_PROGRESS)
+    progress = io.Progress(4, 'Migrating')
+    progress._tty = True
+    progress.advance()
+    with io.with_feedback('Importing chunk 1 of 1'):
+        # Progress drawn while the line is open doesn't erase it
+        progress.advance()
+        assert output.getvalue().endswith('Importing chunk 1 of 1... ')
+    progress.advance(2)
+    progress.close()
+
+    text = output.getvalue()
+    assert 'Importing chunk 1 of 1... OK\n' in text
+    assert '4/4 (100%)' in text.splitlines()[-1]
+
+
+def test_events(output):
+    events = _io.StringIO()
+    io.configure(io.LEVEL_SUMMARY, events)
+    io.detail('hidden')
+    io.event('migration_finished', added=2)
+    with pytest.raises(RuntimeError):
+        with io.with_feedback('Doing', detail=True):
+            raise RuntimeError('boom')
+    io.flush()
+
+    assert output.getvalue() == 'Doing... FAILED (boom)\n'
+    lines = [json.loads(line) for line in events.getvalue().splitlines()]
+    assert [(e['event'], e.get('message')) for e in lines] == [
+        ('message', 'hidden'),
+        ('migration_finished', None),
+        ('message', 'Doing... FAILED (boom)'),
+    ]
+    assert lines[1]['added'] == 2
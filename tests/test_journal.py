@@ -0,0 +1,74 @@
+""" Journal Tests
+
+Covers the on-modify hook and draining the journal it writes.
+"""
+import io
+import json
+
+import pytest
+from todoist_taskwarrior import journal
+
+
+def task(**kw):
+    task = {'uuid': 'uuid-1', 'description': 'task 1', 'status': 'pending',
+            'todoist_id': '1'}
+    task.update(kw)
+    return task
+
+
+def run_hook(path, original, modified):
+    stdin = io.StringIO(json.dumps(original) + '\n' + json.dumps(modified) + '\n')
+    stdout = io.StringIO()
+    assert journal.main([str(path)], stdin=stdin, stdout=stdout) == 0
+    return stdout.getvalue().splitlines()
+
+
+def test_journal_entry():
+    entry = journal.journal_entry(task(), task(status='completed'))
+    assert entry['todoist_id'] == '1' and entry['uuid'] == 'uuid-1'
+    assert entry['status'] == 'completed' and entry['changed'] == ['status']
+
+    assert journal.journal_entry(task(), task(tags=['x'])) is None
+    original = task()
+    del original['todoist_id']
+    assert journal.journal_entry(original, dict(original, status='completed')) is None
+
+
+def test_hook(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    output = run_hook(path, task(), task(status='completed'))
+    assert json.loads(output[0]) == task(status='completed')
+    run_hook(path, task(), task(tags=['ignored']))
+    run_hook(path, task(), task(description='renamed'))
+
+    with journal.Journal(str(path)).drain() as entries:
+        assert [e['changed'] for e in entries] == [['status'], ['description']]
+
+
+def test_hook_never_blocks_the_modification(tmp_path):
+    path = tmp_path / 'missing' / 'journal.jsonl'
+    output = run_hook(path, task(), task(status='completed'))
+    assert json.loads(output[0])['status'] == 'completed'
+    assert 'could not journal task' in output[1]
+
+
+def test_drain(tmp_path):
+    j = journal.Journal(str(tmp_path / 'journal.jsonl'))
+    assert not j.enabled
+    j.create()
+    assert j.enabled
+    j.append({'todoist_id': '1'})
+
+    # Entries survive a failed drain, ahead of newer ones
+    with pytest.raises(RuntimeError):
+        with j.drain() as entries:
+            j.append({'todoist_id': '2'})
+            raise RuntimeError
+    with j.drain() as entries:
+        assert [e['todoist_id'] for e in entries] == ['1', '2']
+    with j.drain() as entries:
+        assert entries == []
+    assert j.enabled
+
+    j.remove()
+    assert not j.enabled
@@ -0,0 +1,66 @@
+""" Plan File Tests """
+import gzip
+
+import pytest
+from todoist_taskwarrior import errors, models, plans
+
+
+def test_plan_round_trip(tmp_path):
+    path = str(tmp_path / 'plan.gz')
+    data = models.MappedTask(1, 'task 1', project='Inbox', tags=('a',))
+    with plans.PlanWriter(path, full=True) as writer:
+        writer.add(plans.OP_ADD, 1, data, hash='h1', close=False)
+        writer.add(plans.OP_CLOSE, 2, hash='h2', uuid='u2', modified=None)
+        writer.add(plans.OP_TODOIST_CLOSE, 3)
+        writer.finish([1, 2], complete=True, digests=['d1', 'd2'])
+
+    plan = plans.read_plan(path)
+    assert plan.header['full']
+    assert plan.counts == {'add': 1, 'close': 1, 'todoist_close': 1}
+    assert plan.processed == [1, 2] and plan.complete
+    assert plan.digests == {1: 'd1', 2: 'd2'}
+
+    add, close, todoist_close = plan.ops
+    assert add == {'op': 'add', 'tid': 1, 'hash': 'h1',
+                   'task': {'description': 'task 1', 'project': 'Inbox', 'tags': ['a']}}
+    assert plans.mapped_task(add) == data.replace(tags=['a'])
+    assert close == {'op': 'close', 'tid': 2, 'hash': 'h2', 'uuid': 'u2'}
+    assert plan.of(plans.OP_TODOIST_CLOSE) == [todoist_close]
+
+
+def test_plan_target(tmp_path):
+    path = str(tmp_path / 'plan.gz')
+    target = plans.target('token', '~/.taskrc')
+    assert target == plans.target('token', '~/./.taskrc')
+    assert 'token' not in target
+    with plans.PlanWriter(path, target=target) as writer:
+        writer.finish([])
+
+    assert plans.read_plan(path, target).header['target'] == target
+    for other in (plans.target('other', '~/.taskrc'),
+                  plans.target('token', '~/.taskrc-work')):
+        with pytest.raises(errors.InvalidPlan, match='another Todoist account'):
+            plans.read_plan(path, other)
+
+
+def test_interrupted_plan_is_discarded(tmp_path):
+    path = tmp_path / 'plan.gz'
+    with pytest.raises(RuntimeError):
+        with plans.PlanWriter(str(path)) as writer:
+            writer.add(plans.OP_TODOIST_CLOSE, 3)
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('content', [
+    b'not a plan',
+    gzip.compress(b'{"version": 99}\n'),
+    gzip.compress(b'{"version": 2}\n{"op": "add", "tid": 1}\n'),
+    gzip.compress(b'{"version": 2}\n{"op": "drop", "tid": 1}\n'
+                  b'{"op": "end", "processed": [], "complete": false}\n'),
+])
+def test_invalid_plans(tmp_path, content):
+    path = tmp_path / 'plan.gz'
+    path.write_bytes(content)
+    with pytest.raises(errors.InvalidPlan):
+        plans.read_plan(str(path))
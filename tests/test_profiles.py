@@ -0,0 +1,56 @@
+""" Profiles Tests """
+import json
+
+import pytest
+from todoist_taskwarrior import errors, profiles
+
+
+def write_profiles(tmp_path, config):
+    path = tmp_path / 'profiles.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_load_profiles(tmp_path, monkeypatch):
+    path = write_profiles(tmp_path, {
+        'work': {
+            'api_key_env': 'WORK_KEY',
+            'taskrc': '~/.taskrc-work',
+            'map_project': {'Inbox': 'work', 'Taxes': ''},
+            'map_tag': {'errands': None},
+        },
+        'home': {'api_key_env': 'HOME_KEY', 'cache_dir': '/tmp/home-cache'},
+    })
+    loaded = profiles.load_profiles(path)
+    assert sorted(loaded) == ['home', 'work']
+
+    work = loaded['work']
+    assert work.taskrc == '~/.taskrc-work'
+    assert work.cache_dir.endswith('/work/')
+    assert work.map_project == {'Inbox': 'work', 'Taxes': None}
+    assert work.map_tag == {'errands': None}
+    assert work.journal.endswith('work.journal.jsonl')
+    assert loaded['home'].cache_dir == '/tmp/home-cache'
+    assert loaded['home'].map_project == {}
+
+    monkeypatch.setenv('WORK_KEY', 'secret')
+    assert work.api_key == 'secret'
+    monkeypatch.delenv('WORK_KEY')
+    with pytest.raises(errors.InvalidProfile, match=r'\$WORK_KEY is not set'):
+        work.api_key
+
+
+@pytest.mark.parametrize('config', [
+    [],
+    {'work': {'taskrc': '~/.taskrc'}},
+    {'work': {'api_key_env': 'KEY', 'map_projects': {}}},
+    {'work': {'api_key_env': 'KEY', 'map_project': ['Inbox=work']}},
+])
+def test_invalid_profiles(tmp_path, config):
+    with pytest.raises(errors.InvalidProfile):
+        profiles.load_profiles(write_profiles(tmp_path, config))
+
+
+def test_missing_profiles_file(tmp_path):
+    with pytest.raises(errors.InvalidProfile):
+        profiles.load_profiles(str(tmp_path / 'missing.json'))
@@ -0,0 +1,60 @@
+""" Profiling Tests
+
+Tests the stage timings and counters behind `--profile`.
+"""
+import json
+import pytest
+from todoist_taskwarrior import profiling
+
+
+@pytest.fixture(autouse=True)
+def profile():
+    profiling.reset()
+    profiling.enable()
+    yield
+    profiling.enable(False)
+    profiling.reset()
+
+
+def test_timed_and_counted():
+    calls = []
+    fn = profiling.timed('stage')(profiling.counted('calls', calls.append))
+    for i in range(10):
+        fn(i)
+
+    summary = profiling.summary()
+    assert summary['counters'] == {'calls': 10}
+    stage = summary['stages']['stage']
+    assert stage['calls'] == 10
+    assert stage['p50'] <= stage['p90'] <= stage['p99'] <= stage['max']
+    assert calls == list(range(10))
+
+
+def test_percentiles():
+    values = list(range(1, 101))
+    assert profiling._percentile(values, 50) == 50
+    assert profiling._percentile(values, 99) == 99
+    assert profiling._percentile([7], 90) == 7
+
+
+def test_disabled():
+    profiling.enable(False)
+    profiling.timed('stage')(lambda: None)()
+    profiling.count('calls')
+    assert profiling.summary() == {'stages': {}, 'counters': {}}
+
+
+def test_profile_option(run_cli, td, tmp_path):
+    td.state.items = [{
+        'id': 1, 'content': 'task', 'project_id': 1, 'labels': [],
+        'priority': 1, 'date_added': '2019-01-01T10:00:00Z', 'checked': 0,
+    }]
+    output = tmp_path / 'profile.json'
+    result = run_cli('--profile-output', str(output), '--output', 'summary',
+                     'migrate', '--no-sync')
+    assert 'Profile (seconds)' in result.output
+    assert 'map_to_tw' in result.output
+
+    stages = json.loads(output.read_text())['stages']
+    assert stages['map_to_tw']['calls'] == 1
+    assert stages['tw.add_task']['calls'] == 1
@@ -193,3 +193,13 @@ def test_unsupported():
     with pytest.raises(errors.UnsupportedRecurrence):
         utils.parse_recur_string('every monday,tuesday,wednesday')
 
+
+def test_cache():
+    utils._parse_normalized_recur.cache_clear()
+    for _ in range(3):
+        assert utils.parse_recur_string(' Every  DAY ') == 'daily'
+        with pytest.raises(errors.UnsupportedRecurrence):
+            utils.parse_recur_string('every mon,tues')
+
+    info = utils._parse_normalized_recur.cache_info()
+    assert (info.hits, info.misses) == (4, 2)
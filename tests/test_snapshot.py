@@ -0,0 +1,115 @@
+""" Snapshot Tests """
+import pytest
+from todoist_taskwarrior import errors, snapshot
+
+
+def make_state(count=150):
+    items = [
+        {'id': 1000 + i, 'content': f'task {i}', 'project_id': 1 + i % 3,
+         'checked': int(i % 10 == 0), 'labels': [i % 2]}
+        for i in range(count)
+    ]
+    items[1]['project_id'] = None
+    return snapshot.TodoistState(
+        items, projects=[{'id': 1, 'name': 'Inbox', 'parent_id': None}],
+        labels=[{'id': 1, 'name': 'errands'}], sync_token='abc')
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'token.snapshot')
+    original = make_state()
+    original.save(path)
+
+    state = snapshot.TodoistState.load(path)
+    assert state.sync_token == 'abc'
+    assert state.projects == original.projects
+    assert state.labels == original.labels
+    assert len(state.items) == 150
+    assert list(state.items) == list(original.items)
+    assert state.items[-1]['id'] == 1149
+
+    empty = str(tmp_path / 'empty.snapshot')
+    snapshot.TodoistState().save(empty)
+    assert list(snapshot.TodoistState.load(empty).items) == []
+
+
+def test_items_are_read_lazily(tmp_path):
+    path = str(tmp_path / 'token.snapshot')
+    make_state().save(path)
+    items = snapshot.TodoistState.load(path).items
+
+    # Indexed columns don't decompress any item
+    assert items.column('id')[:3] == [1000, 1001, 1002]
+    assert items.column('project_id')[:3] == [1, None, 3]
+    assert sum(items.column('checked')) == 15
+    assert items._block == (None, None)
+
+    # Items are decompressed a block at a time
+    assert items[71]['content'] == 'task 71'
+    assert items._block[0] == 1 and len(items._block[1]) == 64
+    assert items.column('labels')[:2] == [[0], [1]]
+
+    # Changes are kept until saved
+    items.update(71, checked=1)
+    items.delete(0)
+    assert items[71]['checked'] == 1 and items[0] is None
+    assert [c for c in items.column('checked') if c] == [1] * 15
+    assert len(list(items)) == 149
+
+
+def test_save_copies_unchanged_blocks(tmp_path, monkeypatch):
+    path = str(tmp_path / 'token.snapshot')
+    make_state(400).save(path)
+    state = snapshot.TodoistState.load(path)
+    assert not state.changed
+
+    state.apply({'items': [
+        {'id': 1071, 'content': 'renamed'},
+        {'id': 1000, 'is_deleted': 1},
+        {'id': 2000, 'content': 'new', 'project_id': 5, 'checked': 0},
+    ]})
+    assert state.changed
+    decompressed = []
+    block = snapshot.Snapshot.block
+    monkeypatch.setattr(snapshot.Snapshot, 'block', lambda self, n: (
+        decompressed.append(n) or block(self, n)))
+    state.save(path)
+    assert set(decompressed) == {0, 1, 6}
+    assert not state.changed
+
+    items = snapshot.TodoistState.load(path).items
+    assert len(items) == 400
+    assert items.column('id')[:2] == [1001, 1002]
+    assert items.column('project_id')[-1] == 5
+    assert [i['content'] for i in items if i['id'] in (1071, 2000)] == [
+        'renamed', 'new']
+
+
+def test_apply_response():
+    state = make_state(3)
+    state.apply({
+        'sync_token': 'def',
+        'items': [
+            {'id': 1000, 'content': 'renamed'},
+            {'id': 1001, 'is_deleted': 1},
+            {'id': 2000, 'content': 'new'},
+        ],
+        'labels': [{'id': 2, 'name': 'someday'}],
+    })
+    assert state.sync_token == 'def'
+    assert [(i['id'], i['content']) for i in state.items] == [
+        (1000, 'renamed'), (1002, 'task 2'), (2000, 'new')]
+    assert state.items[0]['project_id'] == 1
+    assert [l['id'] for l in state.labels] == [1, 2]
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'not a snapshot',
+    snapshot.MAGIC + b'\x02\x00\x00\x00{}',
+])
+def test_invalid_snapshot(tmp_path, content):
+    path = tmp_path / 'token.snapshot'
+    path.write_bytes(content)
+    with pytest.raises(errors.InvalidSnapshot):
+        snapshot.TodoistState.load(str(path))
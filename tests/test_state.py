@@ -0,0 +1,69 @@
+""" State Store Tests """
+import pytest
+from todoist_taskwarrior import models, state
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = state.StateStore(str(tmp_path / 'state' / 'token.state.sqlite3'))
+    yield store
+    store.close()
+
+
+def tw_task(tid, uuid=None, status='pending'):
+    return {'todoist_id': str(tid), 'uuid': uuid or f'uuid-{tid}', 'status': status}
+
+
+def test_links(store):
+    assert store.needs_rebuild()
+    assert store.get(1) is None
+
+    store.link(1, tw_task(1), 'abc')
+    link = store.get(1)
+    assert (link.todoist_id, link.uuid, link.status, link.hash) == (
+        '1', 'uuid-1', 'pending', 'abc')
+    assert len(store) == 1
+
+
+def test_set_status(store):
+    for tid in (1, 2, 3):
+        store.link(tid, tw_task(tid), 'abc')
+    store.set_status(['1', 3], 'deleted')
+    assert [store.get(tid).status for tid in (1, 2, 3)] == [
+        'deleted', 'pending', 'deleted']
+    assert store.get(1).hash == 'abc'
+
+
+def test_transaction(store):
+    store.rebuild([])
+    assert not store.needs_rebuild()
+
+    with store.transaction():
+        store.link(1, tw_task(1))
+    assert store.get(1) and not store.needs_rebuild()
+
+    # A failed run is rolled back and requires a rebuild
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.link(2, tw_task(2))
+            raise RuntimeError
+    assert store.get(2) is None
+    assert store.needs_rebuild()
+
+
+def test_rebuild(store):
+    store.link(1, tw_task(1), 'keep')
+    store.link(2, tw_task(2), 'stale')
+    store.link(3, tw_task(3), 'gone')
+
+    counts = store.rebuild([
+        tw_task(1), tw_task(2, status='completed'), tw_task(4)])
+    assert counts == {'added': 1, 'removed': 1, 'changed': 1}
+    assert [store.get(i) and store.get(i).hash for i in (1, 2, 3, 4)] == [
+        'keep', None, None, None]
+
+
+def test_content_hash():
+    data = models.MappedTask(1, 'task 1', project='Work')
+    assert state.content_hash(data) == state.content_hash(data.replace(tags=['x']))
+    assert state.content_hash(data) != state.content_hash(data.replace(project='Home'))
@@ -1,26 +1,108 @@
 import click
+import contextlib
+import json
 import logging
 import os
+import random
+import shlex
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed,
+    wait)
+from io import StringIO
 
-from todoist.api import TodoistAPI
-from . import errors, io, utils, validation, gateways
+from . import (
+    errors, io, utils, validation, gateways, journal, models, plans,
+    profiles, profiling, recurrences, state)
 from . import __title__, __version__
 
 
 @click.group()
 @click.version_option(version=__version__, prog_name=__title__)
-@click.option('--todoist-api-key', envvar='TODOIST_API_KEY', required=True)
-@click.option('--tw-config-file', envvar='TASKRC', default='~/.taskrc')
+@click.option('--todoist-api-key',
+        help='Todoist API key (default: $TODOIST_API_KEY).')
+@click.option('--tw-config-file',
+        help='Taskwarrior config file (default: $TASKRC or ~/.taskrc).')
+@click.option('--cache-dir',
+        help=f'Directory of the local Todoist cache and state '
+             f'(default: $TODOIST_CACHE_DIR or {gateways.TODOIST_CACHE}).')
+@click.option('--account', metavar='NAME',
+        help='Use the API key, Taskwarrior config, cache directory and maps '
+             'of an account from the --accounts-file, instead of the three '
+             'options above.')
+@click.option('--accounts-file', metavar='FILE', type=click.Path(dir_okay=False),
+        envvar='TODOIST_TASKWARRIOR_ACCOUNTS',
+        help=f'JSON file of account profiles (default: {profiles.PROFILES_FILE}).')
 @click.option('--debug', is_flag=True, default=False)
+@click.option('--profile', is_flag=True, default=False,
+        help='Print the time spent in each stage when the command is done.')
+@click.option('--profile-output', metavar='FILE', type=click.Path(dir_okay=False),
+        help='Also write the --profile summary as JSON to FILE.')
+@click.option('--output', type=click.Choice(io.LEVELS), default=io.LEVEL_TASKS,
+        show_default=True,
+        help='Print a line for every task, a progress line, or only summaries.')
+@click.option('--events', metavar='FILE', type=click.File('w', lazy=False),
+        help='Write messages and progress as JSON lines to FILE (- for stdout).')
 @click.pass_context
-def cli(ctx, todoist_api_key, tw_config_file, debug):
+def cli(ctx, todoist_api_key, tw_config_file, cache_dir, account,
+        accounts_file, debug, profile, profile_output, output, events):
     """Manage the migration of data from Todoist into Taskwarrior. """
     ctx.ensure_object(Ctx)
+    ctx.obj.accounts_file = accounts_file
+
+    if account:
+        # The account replaces these options, but not the environment
+        # variables they default to
+        if todoist_api_key or tw_config_file or cache_dir:
+            raise click.UsageError(
+                '--account can\'t be combined with --todoist-api-key, '
+                '--tw-config-file or --cache-dir.')
+        try:
+            selected = profiles.load_profiles(accounts_file).get(account)
+            if selected is None:
+                raise errors.InvalidProfile(account, 'no such profile')
+            todoist_api_key = selected.api_key
+        except errors.InvalidProfile as e:
+            raise click.BadParameter(str(e), param_hint='--account')
+        tw_config_file = selected.taskrc
+        cache_dir = selected.cache_dir
+        ctx.obj.profile = selected
+    else:
+        todoist_api_key = todoist_api_key or os.environ.get('TODOIST_API_KEY')
+        tw_config_file = (
+            tw_config_file or os.environ.get('TASKRC') or '~/.taskrc')
+        cache_dir = cache_dir or os.environ.get('TODOIST_CACHE_DIR')
+        if not todoist_api_key and ctx.invoked_subcommand != 'sync':
+            # `sync --all-accounts` reads the keys from the profiles instead
+            raise click.UsageError('Missing option "--todoist-api-key".')
+
+    io.configure(output, events)
+    profiled = profile or profile_output
+    if profiled:
+        profiling.reset()
+        profiling.enable()
+
+    @ctx.call_on_close
+    def report():
+        if profiled:
+            profiling.report(profile_output)
+        io.close()
 
     # Configure Todoist with API key and cache
-    ctx.obj.todoist = TodoistAPI(todoist_api_key, cache=gateways.TODOIST_CACHE)
-    ctx.obj.td = gateways.Todoist(todoist_api_key)
+    ctx.obj.td = gateways.Todoist(todoist_api_key, cache_dir)
     ctx.obj.tw = gateways.TaskWarrior(tw_config_file)
+    ctx.obj.target = plans.target(todoist_api_key, tw_config_file)
+    ctx.obj.recurrences = recurrences.RecurrenceStore()
+    ctx.obj.state = state.StateStore(
+        state.state_path(todoist_api_key, cache_dir))
+    ctx.call_on_close(ctx.obj.state.close)
+    ctx.obj.journal = journal.Journal(
+        ctx.obj.profile.journal if ctx.obj.profile else None)
 
     # Setup logging
     level = logging.DEBUG if debug else logging.INFO
@@ -32,7 +114,13 @@ class Ctx:
     """
     td = None
     tw = None
-    todoist = None  # TODO: remove after full migration to gateway.
+    recurrences = None  # Answers to unsupported recurrence prompts
+    state = None  # Links between Todoist and TaskWarrior tasks
+    journal = None  # TaskWarrior changes recorded by the hook
+    profile = None  # Profile of the account selected with --account
+    target = None  # Account and TaskWarrior config plans are written for
+    accounts_file = None
+    interactive = True
 
 
 @cli.command()
@@ -53,26 +141,107 @@ def synchronize(ctx):
 
 
 @cli.command()
-@click.confirmation_option(prompt=f'Are you sure you want to delete {gateways.TODOIST_CACHE}?')
-def clean():
+@click.option('--yes', is_flag=True, default=False,
+        help='Confirm the action without prompting.')
+@click.pass_context
+def clean(ctx, yes):
     """Remove the data stored in the Todoist task cache.
 
+    This includes the snapshot of the Todoist tasks, which the next sync
+    fetches again in full, and the local state, which is rebuilt from
+    TaskWarrior by the next migration.
+
     NOTE - the local Todoist data cache is usually located at:
 
         ~/.todoist-sync
+
+    or in the cache directory of the --account.
     """
-    cache_dir = os.path.expanduser(gateways.TODOIST_CACHE)
+    cache_dir = ctx.obj.td.cache_dir
+    if not yes and not io.confirm(f'Are you sure you want to delete {cache_dir}?'):
+        ctx.abort()
 
-    # Delete all files in directory
+    # Delete all files in directory, leaving the caches of accounts alone
+    kept = []
     for file_entry in os.scandir(cache_dir):
+        if file_entry.is_dir():
+            kept.append(file_entry.path)
+            continue
         with io.with_feedback(f'Removing file {file_entry.path}'):
             os.remove(file_entry)
 
     # Delete directory
+    if kept:
+        io.warn(f"Kept {cache_dir}, it also holds {', '.join(kept)}")
+        return
     with io.with_feedback(f'Removing directory {cache_dir}'):
         os.rmdir(cache_dir)
 
 
+@cli.command()
+@click.option('--project', metavar='PROJECT',
+        help='Only delete tasks in the Taskwarrior project PROJECT and its '
+             'subprojects.')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']),
+        help='Only delete tasks created after the given date (YYYY-MM-DD).')
+@click.option('--chunk-size', type=click.IntRange(min=1),
+        default=gateways.DELETE_CHUNK_SIZE, show_default=True,
+        help='Number of tasks deleted per `task delete`.')
+@click.option('-y', '--yes', is_flag=True, default=False,
+        help='Delete the tasks without asking for confirmation.')
+@click.pass_context
+def revert(ctx, project, since, chunk_size, yes):
+    """Delete the tasks migrated from Todoist from Taskwarrior.
+
+    Every Taskwarrior task with a `todoist_id` is deleted, or only those in
+    --project or created --since a date. The tasks are counted with a single
+    export, and deleted with one `task delete` per --chunk-size tasks.
+    Hooks don't run for these deletions.
+
+    Like other tasks deleted in Taskwarrior, the deleted tasks keep their
+    `todoist_id` and are not migrated again.
+    """
+    logging.debug(
+        f'REVERT version={__version__} project={project} since={since} '
+        f'chunk_size={chunk_size}'
+    )
+    start = time.perf_counter()
+    tasks = ctx.obj.tw.get_migrated_tasks(project=project, since=since)
+    export_seconds = time.perf_counter() - start
+    if not tasks:
+        io.info('No migrated tasks found')
+        return
+    if not yes and not io.confirm(
+            f'Are you sure you want to delete {len(tasks)} tasks?'):
+        io.warn('Aborted, no tasks were deleted')
+        return
+
+    start = time.perf_counter()
+    deleted = 0
+    failed = 0
+    progress = io.Progress(len(tasks), 'Deleting')
+    with ctx.obj.state.transaction():
+        for done, not_done, error in ctx.obj.tw.delete_tasks(tasks, chunk_size):
+            if error:
+                io.error(f'Failed to delete {len(not_done)} tasks: {error}')
+            ctx.obj.state.set_status(
+                (t['todoist_id'] for t in done), gateways.TW_STATUS_DELETED)
+            deleted += len(done)
+            failed += len(not_done)
+            progress.advance(len(done) + len(not_done))
+    progress.close()
+    delete_seconds = time.perf_counter() - start
+
+    io.event('reverted', deleted=deleted, failed=failed,
+             export_seconds=export_seconds, delete_seconds=delete_seconds)
+    io.important(
+        f'Deleted {deleted} tasks in {export_seconds + delete_seconds:.1f}s '
+        f'(export {export_seconds:.1f}s, delete {delete_seconds:.1f}s, '
+        f'{deleted / delete_seconds:.1f} tasks/s)'
+        + (f', {failed} failed' if failed else '')
+    )
+
+
 @cli.command()
 @click.option('--sync/--no-sync', default=True,
         help='Enable/disable Todoist synchronization of the local task cache.')
@@ -88,8 +257,33 @@ def clean():
         help='Only import a task matching the given ID')
 @click.option('--filter-proj-id', type=int,
         help='Only import the tasks in the project matching the given ID')
+@click.option('--filter-subprojects', is_flag=True, default=False,
+        help='Include the subprojects of --filter-proj-id.')
+@click.option('--filter-label-id', type=int,
+        help='Only import the tasks with the label matching the given ID')
+@click.option('--filter-due-before', type=click.DateTime(['%Y-%m-%d']),
+        help='Only import the tasks due before the given date')
+@click.option('--filter-due-after', type=click.DateTime(['%Y-%m-%d']),
+        help='Only import the tasks due after the given date')
+@click.option('--filter-checked/--filter-unchecked', default=None,
+        help='Only import the completed/uncompleted tasks')
+@click.option('--bulk/--no-bulk', default=False,
+        help='Import new tasks with batched `task import` calls.')
+@click.option('--chunk-size', type=click.IntRange(min=1),
+        default=gateways.IMPORT_CHUNK_SIZE, show_default=True,
+        help='Number of tasks sent to each `task import` call with --bulk.')
+@click.option('--full', is_flag=True, default=False,
+        help='Migrate all tasks, not only the ones changed since the last run.')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+        show_default=True,
+        help='Number of Taskwarrior writes to run in parallel.')
+@click.option('--non-interactive', is_flag=True, default=False,
+        help='Skip tasks with unsupported recurrences instead of prompting.')
 @click.pass_context
-def migrate(ctx, sync, map_project, map_tag, filter_task_id, filter_proj_id):
+def migrate(ctx, sync, map_project, map_tag, filter_task_id, filter_proj_id,
+            filter_subprojects, filter_label_id, filter_due_before,
+            filter_due_after, filter_checked, bulk, chunk_size, full, jobs,
+            non_interactive):
     """Migrate tasks from Todoist to Taskwarrior.
 
     By default this command will synchronize with the Todoist servers
@@ -111,71 +305,593 @@ def migrate(ctx, sync, map_project, map_tag, filter_task_id, filter_proj_id):
     This command can be run multiple times and will not duplicate tasks.
     This is tracked in Taskwarrior by setting and detecting the
     `todoist_id` property on the task.
+
+    Only tasks changed on Todoist since the last migration are processed.
+    Pass --full to process every task. The --filter-* options further limit
+    the tasks and can be combined.
+
+    Pass --bulk to import new tasks in batches of --chunk-size tasks instead
+    of one `task add` per task. This is much faster for a first migration.
+
+    Pass --jobs to run Taskwarrior writes for different tasks in parallel.
+    Failures are then reported together at the end of the migration.
+
+    Recurrences which can't be converted are prompted for, and the answers
+    are saved for later runs in:
+
+        ~/.todoist-taskwarrior/recurrences.json
+
+    Pass --non-interactive to skip such tasks instead, and report all of
+    the unsupported recurrences at the end. Skipped tasks are retried on the
+    next run.
     """
     logging.debug(
         f'MIGRATE version={__version__} '
         f'sync={sync} map_project={map_project} map_tag={map_tag} '
-        f'filter_task_id={filter_task_id} filter_proj_id={filter_proj_id}'
+        f'filter_task_id={filter_task_id} filter_proj_id={filter_proj_id} '
+        f'filter_subprojects={filter_subprojects} '
+        f'filter_label_id={filter_label_id} '
+        f'filter_due_before={filter_due_before} '
+        f'filter_due_after={filter_due_after} '
+        f'filter_checked={filter_checked} '
+        f'bulk={bulk} chunk_size={chunk_size} full={full} jobs={jobs} '
+        f'non_interactive={non_interactive}'
     )
+    ctx.obj.interactive = not non_interactive
+    map_project, map_tag = profile_maps(ctx, map_project, map_tag)
+    ctx.obj.td.use_maps(map_project, map_tag)
 
     if sync:
         ctx.invoke(synchronize)
 
-    # Get all matching Todoist tasks
-    tasks = ctx.obj.td.get_tasks(filter_task_id, filter_proj_id)
-    if not tasks:
-        io.warn('No matching tasks found (are you using filters?)')
+    # Count first, so progress can be reported while the tasks stream
+    # through the pipeline below.
+    filters = dict(
+        filter_task_id=filter_task_id,
+        filter_proj_id=filter_proj_id,
+        filter_label_id=filter_label_id,
+        due_before=filter_due_before,
+        due_after=filter_due_after,
+        checked=filter_checked,
+    )
+    filtered = any(v is not None for v in filters.values())
+    filters['subprojects'] = filter_subprojects
+    total = ctx.obj.td.count_tasks(changed_only=not full, **filters)
+    if not total:
+        if filtered:
+            io.warn('No matching tasks found (are you using filters?)')
+        else:
+            io.info('No tasks changed since the last migration')
         return
 
-    io.important(f'Starting migration of {len(tasks)} tasks...')
+    if ctx.obj.state.needs_rebuild():
+        rebuild_state(ctx)
+
+    io.important(f'Starting migration of {total} tasks...')
+    io.event('migration_started', total=total)
+    stats = Counter()
+    processed = []
+    unresolved = {}
+    failed = []
+
+    # Source and filter -> map -> diff -> write. Each stage is a generator
+    # pulling from the previous one, so only the tasks being written are
+    # held in memory.
+    tasks = ctx.obj.td.iter_tasks(changed_only=not full, **filters)
+    progress = io.Progress(total, 'Migrating')
+    mapped = map_tasks(ctx, tasks, progress, map_project, map_tag,
+                       processed, unresolved)
+    with ctx.obj.state.transaction():
+        changes = diff_tasks(ctx, mapped, stats)
+        write_changes(ctx, changes, stats, failed, jobs=jobs, bulk=bulk,
+                      chunk_size=chunk_size)
+    progress.close()
+
+    if failed:
+        stats['failed'] += len(failed)
+        io.error(f'{len(failed)} tasks could not be written to Taskwarrior:')
+        for task, e in failed:
+            io.error(f"  '{task['content']}' (todoist_id={task['id']}): {e}")
+
+    stats['skipped'] += report_unresolved(unresolved, 'migrate')
+
+    # Failed and skipped tasks stay recorded as changed so the next run
+    # retries them.
+    if filtered or failed or unresolved:
+        retry_ids = {task['id'] for task, _ in failed}
+        retry_ids.update(
+            t['id'] for skipped_tasks in unresolved.values() for t in skipped_tasks)
+        ctx.obj.td.mark_processed(
+            [tid for tid in processed if tid not in retry_ids])
+    else:
+        ctx.obj.td.mark_processed()
+
+    io.event('migration_finished', **stats)
+    io.important(
+        f"Migration finished: {stats['added']} added, "
+        f"{stats['updated']} updated, {stats['unchanged']} unchanged, "
+        f"{stats['closed']} closed"
+        + (f", {stats['failed']} failed" if stats['failed'] else '')
+        + (f", {stats['skipped']} skipped" if stats['skipped'] else '')
+    )
+
+
+def report_unresolved(unresolved, command):
+    """Warn about the tasks `map_tasks` skipped, returning their number."""
+    if not unresolved:
+        return 0
+    skipped = sum(len(t) for t in unresolved.values())
+    io.warn(f'{skipped} tasks were skipped because of unsupported recurrences:')
+    for date_string, skipped_tasks in sorted(unresolved.items()):
+        io.warn(f"  '{date_string}' ({len(skipped_tasks)} tasks)")
+    io.warn(f'Run {command} without --non-interactive to set them.')
+    return skipped
+
+
+def profile_maps(ctx, map_project, map_tag):
+    """Add the maps of the selected profile to those given as options,
+    which take precedence.
+    """
+    if not ctx.obj.profile:
+        return map_project, map_tag
+    project = dict(ctx.obj.profile.map_project)
+    project.update(map_project)
+    tag = dict(ctx.obj.profile.map_tag)
+    tag.update(map_tag)
+    return project, tag
+
+
+# Writes queued per worker before the pipeline waits for one to finish
+WRITE_QUEUE_SIZE = 4
+
+
+def map_tasks(ctx, tasks, progress, map_project, map_tag, processed,
+              unresolved):
+    """Map stage: yield `(task, data)` for every Todoist task in `tasks`,
+    advancing `progress` for each.
+
+    The ids of all tasks seen are appended to `processed`. Tasks with an
+    unsupported recurrence are collected in `unresolved` and not yielded.
+    """
+    total = progress.total
     for idx, task in enumerate(tasks):
+        processed.append(task['id'])
+        io.detail(f"Task {idx + 1} of {total}: {task['content']}")
+        logging.debug(f'ITER_TASK task={task}')
+        try:
+            data = map_to_tw(ctx, task, map_project, map_tag)
+        except errors.UnsupportedRecurrence as e:
+            io.detail(f"Skipped, unsupported recurrence '{e.date_string}'", warning=True)
+            unresolved.setdefault(e.date_string, []).append(task)
+            progress.advance()
+            continue
+        progress.advance()
+        yield task, data
+
+
+def diff_tasks(ctx, mapped, stats):
+    """Diff stage: yield `(action, task, tw_task, data)` for every mapped
+    task which needs a write, where action is 'add', 'close' or 'update'.
+
+    Tasks are looked up in the state store first. Only tasks whose content
+    or checked state changed since they were last written are compared
+    with TaskWarrior. Unchanged tasks are only counted in `stats`.
+    """
+    for task, data in mapped:
         tid = task['id']
-        name = task['content']
+        link = ctx.obj.state.get(tid)
+        if not link:
+            yield 'add', task, None, data
+            continue
+
+        io.detail(f'Already exists (todoist_id={tid})')
+        digest = state.content_hash(data)
+        closing = task['checked'] == 1 and link.status == TW_STATUS_PENDING
+        if link.hash == digest and not closing:
+            stats['unchanged'] += 1
+            continue
 
-        # Log message and check if exists
-        io.important(f'Task {idx + 1} of {len(tasks)}: {name}')
-        logging.debug(f'ITER_TASK task={task}')
         tw_task = ctx.obj.tw.get_task(tid)
-        data = map_to_tw(ctx, task, map_project, map_tag)
+        action = compare_task(ctx, task, tw_task, data)
+        if action:
+            yield action, task, tw_task, data
+        else:
+            ctx.obj.state.link(tid, tw_task, digest)
+            stats['unchanged'] += 1
+
+
+def compare_task(ctx, task, tw_task, data):
+    """Return the write bringing `tw_task` in line with the Todoist task,
+    'add', 'close' or 'update', or None if it is up to date.
+    """
+    if not tw_task:
+        # Never migrated, or deleted from TaskWarrior since
+        return 'add'
+    if task['checked'] == 1 and tw_task['status'] == TW_STATUS_PENDING:
+        return 'close'
+    if (tw_task['status'] == TW_STATUS_PENDING
+            and ctx.obj.tw.is_changed(tw_task, data)):
+        return 'update'
+    return None
+
+
+def write_changes(ctx, changes, stats, failed, jobs=1, bulk=False,
+                  chunk_size=gateways.IMPORT_CHUNK_SIZE):
+    """Write stage: apply `changes` to TaskWarrior as they arrive.
+
+    With more than one job, writes run on a thread pool while the earlier
+    stages keep producing changes; `(task, exception)` pairs of failed
+    writes are appended to `failed`. With `bulk`, new tasks are imported
+    once `chunk_size` of them are queued.
+
+    Written tasks are linked in the state store from this thread.
+    """
+    pool = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    pending = {}
+    new_tasks = []
+
+    def record(task, data, outcomes, tw_task):
+        stats.update(outcomes)
+        io.event('task_written', todoist_id=task['id'], outcomes=outcomes)
         if tw_task:
-            io.info(f'Already exists (todoist_id={tid})')
-            if close_if_needed(ctx, tw_task, task):
-                io.info(f'Closed task (todoist_id={tid})')
+            ctx.obj.state.link(task['id'], tw_task, state.content_hash(data))
+
+    def collect(futures):
+        for future in futures:
+            task, data = pending.pop(future)
+            try:
+                record(task, data, *future.result())
+            except Exception as e:
+                logging.debug(f'WRITE_FAILED task={task} error={e}')
+                io.event('task_failed', todoist_id=task['id'], error=str(e))
+                failed.append((task, e))
+
+    try:
+        for action, task, tw_task, data in changes:
+            if bulk and action == 'add':
+                new_tasks.append((task, data))
+                if len(new_tasks) >= chunk_size:
+                    bulk_import(ctx, new_tasks, chunk_size, stats, failed)
+                    new_tasks = []
                 continue
 
-            if tw_task['status'] == TW_STATUS_PENDING:
-                ctx.obj.tw.update(tw_task, data)
-                io.info(f'Updated task (todoist_id={tid})')
-            continue
+            if not pool:
+                record(task, data, *write_task(ctx, action, task, tw_task, data))
+                continue
 
-        tw_task = ctx.obj.tw.add_task(**data)
-        if tw_task:
-            if close_if_needed(ctx, tw_task, task):
-                io.info(f'Closed task (todoist_id={tid})')
+            if len(pending) >= jobs * WRITE_QUEUE_SIZE:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = pool.submit(write_task, ctx, action, task, tw_task, data)
+            pending[future] = (task, data)
+
+        collect(list(as_completed(pending)))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if new_tasks:
+        bulk_import(ctx, new_tasks, chunk_size, stats, failed)
 
 
+def write_task(ctx, action, task, tw_task, data):
+    """Write a single Todoist task to TaskWarrior.
+
+    Applies an action from `diff_tasks` and returns the outcomes for the
+    migration counters along with the written TaskWarrior task. The writes
+    for one task happen in order, even when tasks run in parallel.
+    """
+    tid = task['id']
+    if action == 'close':
+        tw_task = ctx.obj.tw.close(tw_task)
+        io.detail(f'Closed task (todoist_id={tid})')
+        return ['closed'], tw_task
+
+    if action == 'update':
+        tw_task = ctx.obj.tw.update(tw_task, data)
+        io.detail(f'Updated task (todoist_id={tid})')
+        return ['updated'], tw_task
+
+    outcomes = []
+    tw_task = ctx.obj.tw.add_task(data)
+    if tw_task:
+        outcomes.append('added')
+        closed = close_if_needed(ctx, tw_task, task)
+        if closed:
+            io.detail(f'Closed task (todoist_id={tid})')
+            outcomes.append('closed')
+            tw_task = closed
+    return outcomes, tw_task
+
+
+def bulk_import(ctx, new_tasks, chunk_size, stats, failed):
+    """Import `(todoist task, mapped data)` pairs in chunks, appending
+    `(task, exception)` pairs of the tasks not imported to `failed`.
+    """
+    io.important(f'Importing {len(new_tasks)} new tasks...')
+    todoist_tasks = {str(task['id']): task for task, _ in new_tasks}
+    results = ctx.obj.tw.import_tasks(
+        (data for _, data in new_tasks), chunk_size)
+
+    for data, tw_task in results:
+        tid = data.tid
+        if not tw_task:
+            e = errors.TaskwarriorWriteError('not imported')
+            io.event('task_failed', todoist_id=tid, error=str(e))
+            failed.append((todoist_tasks[str(tid)], e))
+            continue
+        io.detail(f'Imported task (todoist_id={tid})')
+        stats['added'] += 1
+        outcomes = ['added']
+        closed = close_if_needed(ctx, tw_task, todoist_tasks[str(tid)])
+        if closed:
+            io.detail(f'Closed task (todoist_id={tid})')
+            stats['closed'] += 1
+            outcomes.append('closed')
+            tw_task = closed
+        io.event('task_written', todoist_id=tid, outcomes=outcomes)
+        ctx.obj.state.link(tid, tw_task, state.content_hash(data))
+
+
+@profiling.timed('map_to_tw')
 def map_to_tw(ctx, task, map_project, map_tag):
-    """Map Todoist task to TaskWarrior task."""
-    project_name = ctx.obj.td.project_name_from_todoist(task['project_id'], map_project)
-    data = {
-        'tid': task['id'],
-        'description': task['content'],
-        'project': utils.maybe_quote_ws(project_name),
-        'priority': utils.parse_priority(task['priority']),
-        'entry': utils.parse_date(task['date_added']),
-        'due': utils.parse_due(utils.try_get_model_prop(task, 'due')),
-        'recur': parse_recur_or_prompt(utils.try_get_model_prop(task, 'due')),
+    """Map Todoist task to a TaskWarrior `MappedTask`."""
+    fields = utils.model_fields(task)
+    due = fields.get('due')
+    logging.debug(f"TAGS labels={fields['labels']}")
+    return models.MappedTask(
+        tid=fields['id'],
+        description=fields['content'],
+        project=ctx.obj.td.project_name_from_todoist(fields['project_id'], map_project),
+        tags=ctx.obj.td.tag_names_from_todoist(fields['labels'], map_tag),
+        priority=utils.parse_priority(fields['priority']),
+        entry=utils.parse_date(fields['date_added']),
+        due=utils.parse_due(due),
+        recur=parse_recur_or_prompt(ctx, due),
+    )
+
+
+@cli.command()
+@click.argument('plan_file', type=click.Path(dir_okay=False))
+@click.option('--sync/--no-sync', default=True,
+        help='Enable/disable Todoist synchronization of the local task cache.')
+@click.option('-p', '--map-project', metavar='SRC=DST', multiple=True,
+        callback=validation.validate_map,
+        help='Project names specified will be translated from SRC to DST. '
+             'If DST is omitted, the project will be unset when SRC matches.')
+@click.option('-t', '--map-tag', metavar='SRC=DST', multiple=True,
+        callback=validation.validate_map,
+        help='Tags specified will be translated from SRC to DST. '
+             'If DST is omitted, the tag will be removed when SRC matches.')
+@click.option('--todoist/--no-todoist', default=True,
+        help='Include/exclude closing Todoist tasks completed in TaskWarrior.')
+@click.option('--full', is_flag=True, default=False,
+        help='Plan all tasks, not only the ones changed since the last run.')
+@click.option('--non-interactive', is_flag=True, default=False,
+        help='Skip tasks with unsupported recurrences instead of prompting.')
+@click.pass_context
+def plan(ctx, plan_file, sync, map_project, map_tag, todoist, full,
+         non_interactive):
+    """Write the changes `sync` would make to PLAN_FILE, without making them.
+
+    Todoist tasks changed since the last run, or all of them with --full,
+    are mapped and compared with a single export of TaskWarrior. The tasks
+    to add, update and close in TaskWarrior, and the tasks to close on
+    Todoist, are written to PLAN_FILE along with an estimate of the time
+    applying them takes. Nothing is written to TaskWarrior or Todoist until
+    the plan is applied with `apply`, with the same Todoist account and
+    TaskWarrior config.
+    """
+    logging.debug(
+        f'PLAN version={__version__} plan_file={plan_file} sync={sync} '
+        f'map_project={map_project} map_tag={map_tag} todoist={todoist} '
+        f'full={full} non_interactive={non_interactive}'
+    )
+    ctx.obj.interactive = not non_interactive
+    map_project, map_tag = profile_maps(ctx, map_project, map_tag)
+    ctx.obj.td.use_maps(map_project, map_tag)
+
+    if sync:
+        ctx.invoke(synchronize)
+
+    start = time.perf_counter()
+    snapshot = ctx.obj.tw.index
+    export_seconds = time.perf_counter() - start
+
+    total = ctx.obj.td.count_tasks(changed_only=not full)
+    processed = []
+    unresolved = {}
+    closing = 0
+    with plans.PlanWriter(plan_file, target=ctx.obj.target, full=full,
+                          maps={'project': map_project, 'tag': map_tag}) as writer:
+        tasks = ctx.obj.td.iter_tasks(changed_only=not full)
+        progress = io.Progress(total, 'Planning')
+        for task, data in map_tasks(ctx, tasks, progress, map_project, map_tag,
+                                    processed, unresolved):
+            tid = task['id']
+            tw_task = ctx.obj.tw.get_task(tid)
+            action = compare_task(ctx, task, tw_task, data)
+            digest = state.content_hash(data)
+            if action == plans.OP_ADD:
+                closing += task['checked'] == 1
+                writer.add(action, tid, data, hash=digest,
+                           close=task['checked'] == 1)
+            elif action:
+                writer.add(action, tid,
+                           data if action == plans.OP_UPDATE else None,
+                           hash=digest, uuid=tw_task['uuid'],
+                           modified=tw_task.get('modified'))
+        progress.close()
+
+        if todoist:
+            for tid, tw_task in snapshot.items():
+                if tw_task['status'] != TW_STATUS_COMPLETED:
+                    continue
+                task = ctx.obj.td.get_task(tid)
+                if task and task['checked'] != 1:
+                    writer.add(plans.OP_TODOIST_CLOSE, task['id'])
+
+        skipped = {
+            t['id'] for skipped_tasks in unresolved.values()
+            for t in skipped_tasks}
+        processed = [tid for tid in processed if tid not in skipped]
+        writer.finish(processed, complete=not skipped, digests=[
+            ctx.obj.td.task_digest(ctx.obj.td.get_task(tid))
+            for tid in processed])
+
+    report_unresolved(unresolved, 'plan')
+    counts = writer.counts
+    processes, requests, seconds = plans.estimate(
+        counts, closing, export_seconds)
+    io.event('plan_written', seconds=seconds, **counts)
+    io.important(
+        f'Plan written to {plan_file}: '
+        f'{counts[plans.OP_ADD]} to add, {counts[plans.OP_UPDATE]} to update, '
+        f'{counts[plans.OP_CLOSE] + closing} to close, '
+        f'{counts[plans.OP_TODOIST_CLOSE]} to close on Todoist'
+    )
+    io.important(
+        f'Applying it takes {processes} task processes and {requests} '
+        f'Todoist requests, about {seconds:.0f}s'
+    )
+
+
+@cli.command()
+@click.argument('plan_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=click.IntRange(min=1),
+        default=gateways.IMPORT_CHUNK_SIZE, show_default=True,
+        help='Number of tasks written per `task import`.')
+@click.pass_context
+def apply(ctx, plan_file, chunk_size):
+    """Apply a plan written by `plan`.
+
+    TaskWarrior tasks are added, updated and closed through chunked `task
+    import` calls, and Todoist tasks are closed in batched requests.
+
+    Tasks changed in TaskWarrior since the plan was written are left alone
+    and reported. They are part of the next plan, like tasks changed on
+    Todoist by syncs since the plan was written. New tasks which were
+    already imported are skipped, so a plan can be applied again after a
+    failure. Plans written for another Todoist account or TaskWarrior config
+    are refused.
+    """
+    try:
+        plan = plans.read_plan(plan_file, ctx.obj.target)
+    except errors.InvalidPlan as e:
+        io.error(str(e))
+        ctx.exit(1)
+    logging.debug(
+        f'APPLY version={__version__} plan_file={plan_file} '
+        f'chunk_size={chunk_size} counts={dict(plan.counts)}'
+    )
+
+    if ctx.obj.state.needs_rebuild():
+        rebuild_state(ctx)
+    maps = plan.header.get('maps', {})
+    ctx.obj.td.use_maps(maps.get('project', {}), maps.get('tag', {}))
+
+    io.important(f'Applying {len(plan.ops)} planned changes...')
+    start = time.perf_counter()
+    stats = Counter()
+    retry = set()
+    with ctx.obj.state.transaction():
+        apply_taskwarrior(ctx, plan, chunk_size, stats, retry)
+
+    # Tasks changed on Todoist by syncs since planned, before closing any
+    retry.update(
+        tid for tid, digest in plan.digests.items()
+        if changed_since_planned(ctx, tid, digest))
+
+    closes = plan.of(plans.OP_TODOIST_CLOSE)
+    for op in closes:
+        ctx.obj.td.close_task(op['tid'])
+    failed = commit_todoist(ctx, len(closes))
+    stats['todoist_closed'] = len(closes) - len(failed)
+    stats['failed'] += len(failed)
+
+    # Tasks which failed or changed since, in TaskWarrior or on Todoist,
+    # stay recorded as changed, so the next run retries them.
+    ctx.obj.td.mark_processed(
+        [tid for tid in plan.processed if tid not in retry],
+        complete=plan.complete and not retry)
+
+    elapsed = time.perf_counter() - start
+    io.event('plan_applied', seconds=elapsed, **stats)
+    io.important(
+        f"Plan applied in {elapsed:.1f}s: {stats['added']} added, "
+        f"{stats['updated']} updated, {stats['closed']} closed, "
+        f"{stats['todoist_closed']} closed on Todoist"
+        + (f", {stats['conflicts']} changed since planned"
+           if stats['conflicts'] else '')
+        + (f", {stats['failed']} failed" if stats['failed'] else '')
+    )
+
+
+def changed_since_planned(ctx, tid, digest):
+    """Whether the Todoist task `tid` changed since its `digest` was
+    planned, or is gone.
+    """
+    task = ctx.obj.td.get_task(tid)
+    return task is None or ctx.obj.td.task_digest(task) != digest
+
+
+def apply_taskwarrior(ctx, plan, chunk_size, stats, retry):
+    """Apply the TaskWarrior operations of `plan`, linking the written tasks
+    in the state store.
+
+    New tasks are imported first, then the updates and closes, including
+    the closes of new tasks, are written together. The ids of Todoist tasks
+    which failed or changed since planned are added to `retry`.
+    """
+    tw = ctx.obj.tw
+    adds = {str(op['tid']): op for op in plan.of(plans.OP_ADD)}
+    imported = {
+        str(data.tid): tw_task for data, tw_task in tw.import_tasks(
+            (plans.mapped_task(op) for op in adds.values()), chunk_size)
     }
 
-    # Tags
-    logging.debug(f"TAGS labels={task['labels']}")
-    data['tags'] = [
-        utils.try_map(map_tag, ctx.obj.todoist.labels.get_by_id(l_id)['name'])
-        for l_id in task['labels']
-    ]
+    writes = []
+    for tid, op in adds.items():
+        if tid not in imported:
+            io.detail(f'Already exists (todoist_id={tid})')
+            stats['unchanged'] += 1
+        elif not imported[tid]:
+            io.error(f"Failed to import '{op['task']['description']}' "
+                     f'(todoist_id={tid})')
+            stats['failed'] += 1
+            retry.add(op['tid'])
+        else:
+            stats['added'] += 1
+            io.event('task_written', todoist_id=op['tid'], outcomes=['added'])
+            ctx.obj.state.link(op['tid'], imported[tid], op['hash'])
+            if op.get('close'):
+                writes.append((op, imported[tid], None, True))
 
-    # Dates
-    return data
+    for op in plan.of(plans.OP_UPDATE) + plan.of(plans.OP_CLOSE):
+        tw_task = tw.get_task(op['tid'])
+        if (not tw_task or tw_task['uuid'] != op['uuid']
+                or tw_task.get('modified') != op.get('modified')):
+            io.warn(f"Changed since planned, skipped (todoist_id={op['tid']})")
+            stats['conflicts'] += 1
+            retry.add(op['tid'])
+        elif op['op'] == plans.OP_UPDATE:
+            writes.append((op, tw_task, plans.mapped_task(op), False))
+        else:
+            writes.append((op, tw_task, None, True))
+
+    results = tw.write_tasks(
+        [(tw_task, data, close) for _, tw_task, data, close in writes],
+        chunk_size)
+    for (op, _, _, close), tw_task in zip(writes, results):
+        if not tw_task:
+            io.error(f"Failed to write task (todoist_id={op['tid']})")
+            stats['failed'] += 1
+            retry.add(op['tid'])
+            continue
+        outcome = 'closed' if close else 'updated'
+        stats[outcome] += 1
+        io.event('task_written', todoist_id=op['tid'], outcomes=[outcome])
+        ctx.obj.state.link(op['tid'], tw_task, op['hash'])
 
 
 @cli.command()
@@ -185,21 +901,336 @@ def map_to_tw(ctx, task, map_project, map_tag):
               help='Enable/disable synchronization to TaskWarrior.')
 @click.option('--todoist/--no-todoist', default=True,
               help='Enable/disable synchronization to Todoist.')
+@click.option('--full', is_flag=True, default=False,
+              help='Migrate all tasks, not only the ones changed since the last run.')
+@click.option('--non-interactive', is_flag=True, default=False,
+              help='Skip tasks with unsupported recurrences instead of prompting.')
+@click.option('--scan', is_flag=True, default=False,
+              help='Check every Todoist task for completion in TaskWarrior, '
+                   'even if the hook is installed.')
+@click.option('--all-accounts', is_flag=True, default=False,
+              help='Sync every account of the --accounts-file concurrently.')
+@click.option('--jobs', type=click.IntRange(min=1),
+              help='Number of accounts synced at once with --all-accounts '
+                   '(default: one per CPU).')
 @click.pass_context
-def sync(ctx, sync, taskw, todoist):
+def sync(ctx, sync, taskw, todoist, full, non_interactive, scan, all_accounts,
+         jobs):
     """2-way synchronization between TaskWarrior and Todoist.
+
+    Tasks completed in TaskWarrior are closed on Todoist. When the hook is
+    installed (see install-hook), only the tasks it recorded are pushed.
+    Otherwise, or with --scan, every Todoist task is checked.
+
+    With --all-accounts, every account is synced in its own process, with
+    its own Todoist cache and Taskwarrior data, and the outcomes are
+    reported together. Unsupported recurrences are then always skipped, as
+    with --non-interactive.
     """
+    if all_accounts:
+        options = [
+            '--sync' if sync else '--no-sync',
+            '--taskw' if taskw else '--no-taskw',
+            '--todoist' if todoist else '--no-todoist',
+        ]
+        options += ['--full'] * full + ['--scan'] * scan
+        sync_accounts(ctx, options, jobs)
+        return
+    if not ctx.obj.td.api_key:
+        raise click.UsageError('Missing option "--todoist-api-key".')
+
     # TODO: bad naming of option. Could be --todoist-cache.
     if sync:
         ctx.invoke(synchronize)
 
-    todoist_tasks = ctx.obj.td.get_tasks()
-
     if todoist:
-        close_todoist_tasks(ctx, todoist_tasks)
+        if ctx.obj.journal.enabled and not scan:
+            push_journal(ctx)
+        else:
+            close_todoist_tasks(ctx, ctx.obj.td.get_tasks())
 
     if taskw is True:
-        ctx.invoke(migrate)
+        # The local cache is already up to date at this point.
+        ctx.invoke(migrate, sync=False, full=full,
+                   non_interactive=non_interactive)
+
+
+def sync_accounts(ctx, options, jobs=None):
+    """Run `sync` with `options` for every account in a process pool, then
+    report the outcome of each account and the totals.
+    """
+    try:
+        accounts = profiles.load_profiles(ctx.obj.accounts_file)
+    except errors.InvalidProfile as e:
+        io.error(str(e))
+        ctx.exit(1)
+    if not accounts:
+        io.warn('No accounts found')
+        return
+
+    io.important(f'Syncing {len(accounts)} accounts...')
+    # Buffered output would be written again by the forked workers
+    io.flush()
+    start = time.perf_counter()
+    results = {}
+    jobs = jobs or min(len(accounts), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(sync_account, ctx.obj.accounts_file, name, options): name
+            for name in accounts
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logging.debug(f'ACCOUNT_FAILED account={name}', exc_info=True)
+                results[name] = dict(output='', stats={}, error=str(e), seconds=0)
+            # Captured at the summary level, so shown at every level
+            for line in results[name]['output'].splitlines():
+                io.summary(f'[{name}] {line}')
+    elapsed = time.perf_counter() - start
+
+    totals = Counter()
+    failed = 0
+    for name, result in sorted(results.items()):
+        stats = Counter(result['stats'])
+        totals.update(stats)
+        io.event('account_synced', account=name, error=result['error'],
+                 seconds=result['seconds'], **stats)
+        if result['error']:
+            failed += 1
+            io.error(f"Account {name} failed: {result['error']}")
+        else:
+            io.summary(f"Account {name}: {format_sync_stats(stats)} "
+                       f"in {result['seconds']:.1f}s")
+
+    io.important(
+        f'Synced {len(results) - failed} of {len(results)} accounts in '
+        f'{elapsed:.1f}s: {format_sync_stats(totals)}'
+    )
+    if failed:
+        ctx.exit(1)
+
+
+def sync_account(accounts_file, name, options):
+    """Run `sync` for one account, in a worker process of `sync_accounts`.
+
+    The output is captured at the summary level, and the outcome counts are
+    read back from the event stream. Returns them with the error, if any,
+    and the time the sync took.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        events = os.path.join(tmp_dir, 'events.jsonl')
+        args = ['--account', name, '--output', io.LEVEL_SUMMARY,
+                '--events', events]
+        if accounts_file:
+            args += ['--accounts-file', accounts_file]
+        args += ['sync', '--non-interactive'] + list(options)
+
+        output = StringIO()
+        error = None
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            try:
+                code = cli.main(args, obj=Ctx(), standalone_mode=False)
+                if code:
+                    error = f'exited with status {code}'
+            except Exception as e:
+                logging.debug(f'ACCOUNT_FAILED account={name}', exc_info=True)
+                error = str(e) or type(e).__name__
+        seconds = time.perf_counter() - start
+
+        stats = Counter()
+        if not os.path.exists(events):
+            # Failed before the command started
+            return dict(output=output.getvalue(), stats={}, error=error,
+                        seconds=seconds)
+        with open(events) as f:
+            for event in map(json.loads, f):
+                if event['event'] == 'migration_finished':
+                    stats.update({
+                        key: value for key, value in event.items()
+                        if key not in ('time', 'event')})
+                elif event['event'] == 'todoist_closed':
+                    stats['todoist_closed'] += event['closed']
+                    stats['failed'] += event['failed']
+
+    return dict(output=output.getvalue(), stats=dict(stats), error=error,
+                seconds=seconds)
+
+
+def format_sync_stats(stats):
+    return (
+        f"{stats['added']} added, {stats['updated']} updated, "
+        f"{stats['unchanged']} unchanged, {stats['closed']} closed, "
+        f"{stats['todoist_closed']} closed on Todoist"
+        + (f", {stats['failed']} failed" if stats['failed'] else '')
+        + (f", {stats['skipped']} skipped" if stats['skipped'] else '')
+    )
+
+
+@cli.command()
+@click.option('--interval', type=float, default=300, show_default=True,
+        callback=validation.validate_positive,
+        help='Seconds between synchronizations with Todoist.')
+@click.option('--jitter', type=click.FloatRange(min=0, max=1), default=0.1,
+        show_default=True,
+        help='Randomly vary each interval by up to this fraction.')
+@click.option('--poll', type=float, default=5, show_default=True,
+        callback=validation.validate_positive,
+        help='Seconds between checks for changes in TaskWarrior.')
+@click.option('--cycles', type=click.IntRange(min=1),
+        help='Stop after this many cycles instead of running until stopped.')
+@click.pass_context
+def watch(ctx, interval, jitter, poll, cycles):
+    """Keep running `sync` in the background.
+
+    The Todoist cache and the TaskWarrior index stay loaded between cycles,
+    so a cycle where nothing changed costs one Todoist sync request. Every
+    --interval seconds, changes are synchronized both ways, as with
+    `sync --non-interactive`.
+
+    In between, tasks changed in TaskWarrior, found through the hook
+    journal (see install-hook) or the modification time of the TaskWarrior
+    data files, are pushed to Todoist within --poll seconds.
+
+    Stop with Ctrl-C or SIGTERM. Journaled changes are pushed before
+    exiting.
+    """
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        handlers = {
+            sig: signal.signal(sig, lambda *_: stop.set())
+            for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+    else:
+        handlers = {}
+
+    io.important(f'Watching for changes every {interval:g}s...')
+    done = 0
+    next_sync = time.monotonic()
+    mtime = ctx.obj.tw.data_mtime()
+    try:
+        while not stop.is_set() and not (cycles and done >= cycles):
+            changed = ctx.obj.tw.data_mtime() != mtime
+            if changed:
+                # Changed by others, the index has to be exported again
+                ctx.obj.tw.invalidate()
+            if time.monotonic() >= next_sync:
+                watch_cycle(ctx, sync, sync=True, non_interactive=True)
+                next_sync = time.monotonic() + interval * (
+                    1 + random.uniform(-jitter, jitter))
+                done += 1
+            elif changed or ctx.obj.journal.pending:
+                io.info('Local changes found')
+                watch_cycle(ctx, sync, sync=False, taskw=False)
+                done += 1
+            # Writes of the cycle itself don't count as local changes
+            mtime = ctx.obj.tw.data_mtime()
+            # Write out the cycle before sleeping, not with the next one
+            io.flush()
+            stop.wait(min(poll, max(0, next_sync - time.monotonic())))
+    finally:
+        for sig, handler in handlers.items():
+            signal.signal(sig, handler)
+
+    if ctx.obj.journal.pending:
+        io.important('Pushing journaled changes before exiting...')
+        push_journal(ctx)
+    io.important(f'Stopped watching after {done} cycles')
+
+
+def watch_cycle(ctx, command, **kwargs):
+    """Run a command for `watch`, reporting errors instead of exiting."""
+    try:
+        ctx.invoke(command, **kwargs)
+    except Exception as e:
+        logging.debug('WATCH_CYCLE_FAILED', exc_info=True)
+        io.error(f'Cycle failed, retrying later: {e}')
+
+
+@cli.command()
+@click.pass_context
+def verify(ctx):
+    """Rebuild the local state from a full TaskWarrior export.
+
+    The state links every Todoist task to its TaskWarrior task, so that
+    `migrate` only compares tasks changed on Todoist with TaskWarrior. It
+    is rebuilt automatically when missing, or after an interrupted
+    migration. Run this after changing TaskWarrior tasks by other means.
+
+    NOTE - the state is stored next to the local Todoist data cache:
+
+        ~/.todoist-sync
+    """
+    counts = rebuild_state(ctx)
+    io.important(
+        f'State rebuilt: {len(ctx.obj.state)} linked tasks '
+        f"({counts['added']} added, {counts['removed']} removed, "
+        f"{counts['changed']} changed)"
+    )
+
+
+@cli.command('install-hook')
+@click.option('--hooks-dir', type=click.Path(file_okay=False),
+        help='TaskWarrior hooks directory, read from the TaskWarrior '
+             'config by default.')
+@click.pass_context
+def install_hook(ctx, hooks_dir):
+    """Install a TaskWarrior hook recording changed tasks for `sync`.
+
+    The on-modify hook appends every modification of a task with a
+    `todoist_id` to a journal, so that `sync` only pushes the tasks changed
+    in TaskWarrior instead of checking every Todoist task. The journal is
+    located at:
+
+        ~/.todoist-taskwarrior/journal.jsonl
+
+    Tasks completed before the hook was installed are only found by
+    `sync --scan`.
+    """
+    path = os.path.join(hooks_dir or ctx.obj.tw.hooks_dir(), journal.HOOK_NAME)
+    # `task` runs hooks from any directory, so the package is found through
+    # PYTHONPATH. A modification is rejected if the hook fails, so the
+    # modified task is passed through as is when journaling does.
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with io.with_feedback(f'Installing hook {path}'):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(
+                '#!/bin/sh\n'
+                'IFS= read -r original\n'
+                'IFS= read -r modified\n'
+                'if output=$(printf \'%s\\n%s\\n\' "$original" "$modified" | '
+                f'PYTHONPATH={shlex.quote(package_dir)}${{PYTHONPATH:+:$PYTHONPATH}} '
+                f'{shlex.quote(sys.executable)} -m todoist_taskwarrior.journal '
+                f'{shlex.quote(ctx.obj.journal.path)}); then\n'
+                '    printf \'%s\\n\' "$output"\n'
+                'else\n'
+                '    printf \'%s\\n\' "$modified"\n'
+                'fi\n'
+                'exit 0\n'
+            )
+        os.chmod(path, 0o755)
+        ctx.obj.journal.create()
+
+
+@cli.command('remove-hook')
+@click.option('--hooks-dir', type=click.Path(file_okay=False),
+        help='TaskWarrior hooks directory, read from the TaskWarrior '
+             'config by default.')
+@click.pass_context
+def remove_hook(ctx, hooks_dir):
+    """Remove the TaskWarrior hook and its journal.
+
+    Changes journaled since the last `sync` are dropped.
+    """
+    path = os.path.join(hooks_dir or ctx.obj.tw.hooks_dir(), journal.HOOK_NAME)
+    if os.path.exists(path):
+        with io.with_feedback(f'Removing hook {path}'):
+            os.remove(path)
+    ctx.obj.journal.remove()
 
 
 TW_STATUS_PENDING = "pending"
@@ -208,40 +1239,112 @@ TW_STATUS_COMPLETED = "completed"
 
 def close_todoist_tasks(ctx, tdtasks):
     """Close tasks on Todoist if those are already closed on TaskWarrior."""
+    closed = 0
     for task in tdtasks:
         tid = task['id']
         twtask = ctx.obj.tw.get_task(tid)
         if (twtask and twtask["status"] == TW_STATUS_COMPLETED
                 and task['checked'] != 1):
-            io.info(f'Closed Todoist task (todoist_id={tid})')
-            ctx.obj.todoist.items.close(task['id'])
-    ctx.obj.todoist.commit()
-    ctx.obj.todoist.sync()
+            io.detail(f'Closing Todoist task (todoist_id={tid})')
+            ctx.obj.td.close_task(tid)
+            closed += 1
+    commit_todoist(ctx, closed)
+
+
+def push_journal(ctx):
+    """Close tasks on Todoist which the hook recorded as completed on
+    TaskWarrior.
+
+    Only the latest entry of every task counts. Entries of tasks Todoist
+    rejected are journaled again, to be retried by the next sync.
+    """
+    with ctx.obj.journal.drain() as entries:
+        latest = {e['todoist_id']: e for e in entries}
+        closing = {}
+        for tid, entry in latest.items():
+            task = ctx.obj.td.get_task(tid)
+            if (task and entry['status'] == TW_STATUS_COMPLETED
+                    and task['checked'] != 1):
+                io.detail(f'Closing Todoist task (todoist_id={tid})')
+                ctx.obj.td.close_task(task['id'])
+                closing[task['id']] = entry
+        logging.debug(
+            f'JOURNAL entries={len(entries)} tasks={len(latest)} '
+            f'closing={len(closing)}')
+
+        failed = commit_todoist(ctx, len(closing))
+        for tid in failed:
+            ctx.obj.journal.append(closing[tid])
+
+
+def commit_todoist(ctx, closed):
+    """Send the `closed` queued closes to Todoist and report the outcome.
+
+    Returns the `{item_id: status}` of the rejected commands.
+    """
+    if not closed:
+        return {}
+
+    start = time.perf_counter()
+    try:
+        with io.with_feedback(f'Closing {closed} tasks on Todoist'):
+            failed = ctx.obj.td.commit()
+    except errors.TodoistSyncError as e:
+        for tid, status in e.failed.items():
+            io.error(f'Failed to close Todoist task (todoist_id={tid}): {status}')
+        raise
+    elapsed = time.perf_counter() - start
+
+    for tid, status in failed.items():
+        io.error(f'Failed to close Todoist task (todoist_id={tid}): {status}')
+    io.event('todoist_closed', closed=closed - len(failed), failed=len(failed),
+             seconds=elapsed)
+    io.important(
+        f'Closed {closed - len(failed)} Todoist tasks in {elapsed:.1f}s '
+        f'({closed / elapsed:.1f} tasks/s)'
+    )
+    return failed
 
 
 def close_if_needed(ctx, tw_task, task):
     """Close existing TaskWarrior task if it is closed on Todoist.
 
-    True is returned if task is closed.
+    The closed task is returned if task is closed, None otherwise.
 
     TODO: And vice versa later when sync from TW to Todoist will be available.
     """
     if task['checked'] == 1 and tw_task['status'] == TW_STATUS_PENDING:
-        ctx.obj.tw.close(id=tw_task['id'])
-        return True
-    return False
+        return ctx.obj.tw.close(tw_task)
+    return None
+
+
+def rebuild_state(ctx):
+    """Rebuild the state store from the TaskWarrior tasks with a
+    `todoist_id`, returning the counts of changed links.
+    """
+    with io.with_feedback('Rebuilding the local state from TaskWarrior'):
+        return ctx.obj.state.rebuild(ctx.obj.tw.index.values())
+
 
+def parse_recur_or_prompt(ctx, due):
+    """Parse the recurrence of a due object, prompting if it is unsupported.
 
-def parse_recur_or_prompt(due):
+    Answers are saved so the same recurrence is only asked once. When not
+    interactive, UnsupportedRecurrence is raised for unanswered ones.
+    """
     try:
         return utils.parse_recur(due)
-    except errors.UnsupportedRecurrence:
-        io.error("Unsupported recurrence: '%s'. Please enter a valid value" % due['string'])
-        return io.prompt(
-            'Set recurrence (todoist style)',
-            default='',
-            value_proc=validation.validate_recur,
-        )
+    except errors.UnsupportedRecurrence as e:
+        if e.date_string not in ctx.obj.recurrences:
+            if not ctx.obj.interactive:
+                raise
+            io.error("Unsupported recurrence: '%s'. Please enter a valid value" % due['string'])
+            ctx.obj.recurrences[e.date_string] = io.prompt(
+                'Set recurrence (todoist style)',
+                default='',
+                value_proc=validation.validate_recur,
+            )
+        return ctx.obj.recurrences[e.date_string]
 
 
 """ Entrypoint """
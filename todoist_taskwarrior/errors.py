@@ -7,3 +7,42 @@ class UnsupportedRecurrence(Exception):
         super().__init__('Unsupported recurrence: %s' % date_string)
         self.date_string = date_string
 
+
+class TodoistSyncError(Exception):
+
+    def __init__(self, reason, failed=None):
+        super().__init__('Todoist sync failed: %s' % reason)
+        self.reason = reason
+        # `{item_id: status}` of the commands rejected before the failure
+        self.failed = dict(failed or {})
+
+
+class TaskwarriorWriteError(Exception):
+
+    def __init__(self, reason):
+        super().__init__('Taskwarrior write failed: %s' % reason)
+        self.reason = reason
+
+
+class InvalidPlan(Exception):
+
+    def __init__(self, path, reason):
+        super().__init__('Invalid plan %s: %s' % (path, reason))
+        self.path = path
+        self.reason = reason
+
+
+class InvalidProfile(Exception):
+
+    def __init__(self, name, reason):
+        super().__init__('Invalid profile %s: %s' % (name, reason))
+        self.name = name
+        self.reason = reason
+
+
+class InvalidSnapshot(Exception):
+
+    def __init__(self, path, reason):
+        super().__init__('Invalid snapshot %s: %s' % (path, reason))
+        self.path = path
+        self.reason = reason
@@ -1,75 +1,493 @@
+import bisect
+import hashlib
+import json
 import logging
+import os
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
 
+import requests
 from todoist.api import TodoistAPI
 from taskw import TaskWarrior as TW
-from . import utils, io
+from taskw.exceptions import TaskwarriorError
+from taskw.utils import encode_task_value
+from . import errors, utils, io, profiling, snapshot
 
 TODOIST_CACHE = '~/.todoist-sync/'
+TODOIST_API_ENDPOINT = 'https://todoist.com'
+
+# The Todoist sync API accepts at most 100 commands per request
+COMMIT_BATCH_SIZE = 100
+COMMIT_RETRIES = 3
+COMMIT_BACKOFF = 1.0
 
 
 class Todoist:
 
-    def __init__(self, api_key):
-        self.todoist = TodoistAPI(api_key, cache=TODOIST_CACHE)
+    def __init__(self, api_key, cache_dir=None):
+        self.api_key = api_key
+        # The client expects a trailing separator on its cache directory
+        self.cache_dir = os.path.join(
+            os.path.expanduser(cache_dir or TODOIST_CACHE), '')
+        self._todoist = None
+        self._state = None
+        self._changes = None
+        self._project_names = None
+        self._project_map = None
+        self._tag_names = None
+        self._tag_map = None
+        self._item_index = None
+        self._maps = None
+
+    @profiling.timed('todoist.get_tasks')
+    def get_tasks(self, filter_task_id=None, filter_proj_id=None,
+                  changed_only=False, **filters):
+        """Return tasks from Todoist.
+
+        With `changed_only`, only tasks changed by syncs since the last
+        `mark_processed` call are returned, unless a full pass is pending.
+        See `iter_tasks` for the other filters.
+        """
+        return list(self.iter_tasks(
+            filter_task_id, filter_proj_id, changed_only, **filters))
+
+    def iter_tasks(self, filter_task_id=None, filter_proj_id=None,
+                   changed_only=False, **filters):
+        """Like `get_tasks`, but yields the tasks straight from the local
+        state instead of building a list.
+
+        Tasks can also be filtered by label ID (`filter_label_id`), due date
+        (`due_before` and `due_after`, both exclusive) and `checked` state.
+        With `subprojects`, `filter_proj_id` includes the tasks of all its
+        subprojects.
+
+        Every filter is answered from the item index. The most selective one
+        picks the candidate tasks, which are then checked against the rest.
+        """
+        index = self.item_index
+        return (index.items[pos] for pos in self._task_positions(
+            index, filter_task_id, filter_proj_id, changed_only, **filters))
+
+    def _task_positions(self, index, filter_task_id=None, filter_proj_id=None,
+                        changed_only=False, filter_label_id=None,
+                        due_before=None, due_after=None, checked=None,
+                        subprojects=False):
+        plan = []
+        if filter_task_id is not None:
+            plan.append(index.ids([filter_task_id]))
+        if changed_only and not self.changes['full']:
+            plan.append(index.ids(self.changes['item_ids']))
+        if filter_proj_id is not None:
+            plan.append(index.bucket(
+                'project_id', self._project_ids(filter_proj_id, subprojects)))
+        if filter_label_id is not None:
+            plan.append(index.bucket('labels', [filter_label_id]))
+        if checked is not None:
+            plan.append(index.bucket('checked', [int(checked)]))
+        if due_before or due_after:
+            plan.append(index.due_between(due_after, due_before))
+
+        if not plan:
+            return index.positions.values()
+        plan.sort(key=lambda positions: len(positions))
+        positions, others = plan[0], [set(p) for p in plan[1:]]
+        return (
+            pos for pos in positions if all(pos in other for other in others))
+
+    def get_task(self, task_id):
+        """Return the Todoist task with the given ID, or None."""
+        index = self.item_index
+        pos = index.positions.get(int(task_id))
+        return None if pos is None else index.items[pos]
+
+    @profiling.timed('todoist.count_tasks')
+    def count_tasks(self, filter_task_id=None, filter_proj_id=None,
+                    changed_only=False, **filters):
+        """Count the tasks `iter_tasks` would yield, from the item index
+        alone.
+        """
+        return sum(1 for _ in self._task_positions(
+            self.item_index, filter_task_id, filter_proj_id, changed_only,
+            **filters))
+
+    @property
+    def item_index(self):
+        """The `ItemIndex` of the local state, rebuilt after syncs."""
+        items = self.state.items
+        if self._item_index is None or not self._item_index.covers(items):
+            self._item_index = ItemIndex(items)
+        return self._item_index
 
-    def get_tasks(self, filter_task_id=None, filter_proj_id=None):
-        """Return tasks from Todoist."""
-        # Build filter function
-        filt = {}
-        if filter_task_id:
-            filt['id'] = filter_task_id
-        if filter_proj_id:
-            filt['project_id'] = filter_proj_id
-        filter_fn = make_filter_fn(filt)
+    def _project_ids(self, project_id, subprojects):
+        if not subprojects:
+            return [project_id]
+        return self._subproject_ids([project_id])
 
-        # Get all matching Todoist tasks
-        tasks = self.todoist.items.all(filt=filter_fn)
-        return tasks
+    def _subproject_ids(self, project_ids):
+        """`project_ids` and the IDs of all their subprojects."""
+        children = {}
+        for p in self.state.projects:
+            children.setdefault(p['parent_id'], []).append(p['id'])
+        ids = list(project_ids)
+        for pid in ids:
+            ids.extend(children.get(pid, []))
+        return ids
 
+    @property
+    def todoist(self):
+        """The Todoist API client, created on first use.
+
+        The client keeps no cache of its own, it syncs from the token of
+        the local state.
+        """
+        if self._todoist is None:
+            self._todoist = TodoistAPI(
+                self.api_key,
+                api_endpoint=TODOIST_API_ENDPOINT,
+                cache=None,
+            )
+            self._todoist.sync_token = self.state.sync_token
+        return self._todoist
+
+    @property
+    def state(self):
+        """The `snapshot.TodoistState` of the account, opened from its
+        snapshot on first use.
+        """
+        if self._state is None:
+            self._state = self._load()
+        return self._state
+
+    @profiling.timed('todoist.load')
+    def _load(self):
+        if not os.path.exists(self._snapshot_path()):
+            return self._load_client_cache()
+        try:
+            return snapshot.TodoistState.load(self._snapshot_path())
+        except errors.InvalidSnapshot as e:
+            logging.warning(f'{e}, syncing everything again')
+            return snapshot.TodoistState()
+
+    def _load_client_cache(self):
+        """Move the JSON cache of the Todoist client, used before snapshots,
+        into a snapshot.
+        """
+        base = os.path.join(self.cache_dir, self.api_key)
+        try:
+            with open(f'{base}.json') as f:
+                cache = json.load(f)
+            with open(f'{base}.sync') as f:
+                sync_token = f.read()
+        except (OSError, ValueError):
+            return snapshot.TodoistState()
+
+        state = snapshot.TodoistState(
+            cache.get('items', []), cache.get('projects', []),
+            cache.get('labels', []), sync_token)
+        state.save(self._snapshot_path())
+        os.remove(f'{base}.json')
+        os.remove(f'{base}.sync')
+        return state
+
+    def _snapshot_path(self):
+        return os.path.join(self.cache_dir, f'{self.api_key}.snapshot')
+
+    def _save(self):
+        """Write the state to the snapshot, if it changed."""
+        if self.state.changed:
+            self.state.save(self._snapshot_path())
+
+    @profiling.timed('todoist.sync')
     def sync(self):
         """TODO: Should not be exposed to external API."""
-        self.todoist.sync()
+        self._apply_response(self.todoist.sync())
+        self._save()
+
+    def close_task(self, tid):
+        """Queue closing of a task. Sent to Todoist on `commit`."""
+        self.todoist.items.close(tid)
+
+    @profiling.timed('todoist.commit')
+    def commit(self, batch_size=COMMIT_BATCH_SIZE, retries=COMMIT_RETRIES,
+               backoff=COMMIT_BACKOFF):
+        """Send queued changes to Todoist, `batch_size` commands at a time.
+
+        Failed requests are retried with exponential backoff. Each response
+        already carries the changes since the last sync, so no further sync
+        is needed to bring the local state up to date.
+
+        Returns a dict of `{item_id: status}` for commands Todoist rejected.
+        Raises TodoistSyncError if a batch can't be sent, with the commands
+        rejected until then as its `failed`.
+        """
+        commands = list(self.todoist.queue)
+        del self.todoist.queue[:]
+
+        failed = {}
+        try:
+            for start in range(0, len(commands), batch_size):
+                batch = commands[start:start + batch_size]
+                response = self._sync_with_retry(batch, retries, backoff)
+                self._apply_response(response)
+
+                statuses = response.get('sync_status', {})
+                for cmd in batch:
+                    item_id = cmd['args']['id']
+                    status = statuses.get(cmd['uuid'])
+                    if status != 'ok':
+                        failed[item_id] = status
+                    elif cmd['type'] == 'item_close':
+                        pos = self.item_index.positions.get(item_id)
+                        if pos is not None:
+                            self.state.items.update(pos, checked=1)
+        except errors.TodoistSyncError as e:
+            e.failed.update(failed)
+            raise
+        finally:
+            self._save()
+        return failed
+
+    def _sync_with_retry(self, commands, retries, backoff):
+        for attempt in range(retries + 1):
+            try:
+                response = self.todoist.sync(commands=commands)
+                if isinstance(response, dict) and 'error' not in response:
+                    return response
+                reason = response.get('error') if isinstance(response, dict) else response
+            except (requests.RequestException, TypeError, ValueError) as e:
+                # The client fails to merge a response which isn't JSON, or
+                # is an error string, with a TypeError or ValueError
+                reason = e
+            logging.debug(f'TODOIST_COMMIT_FAILED attempt={attempt} reason={reason}')
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        raise errors.TodoistSyncError(reason)
+
+    def _apply_response(self, response):
+        self.state.apply(response)
+        if response.get('projects'):
+            self._project_names = None
+        if response.get('labels'):
+            self._tag_names = None
+
+        # Record which items changed so they can be processed incrementally.
+        if response.get('items'):
+            self._item_index = None
+        if response.get('full_sync'):
+            self.changes['full'] = True
+        changed = {item['id'] for item in response.get('items', [])}
+        if not response.get('full_sync'):
+            changed.update(self._affected_item_ids(response))
+        self.changes['item_ids'] = sorted(set(self.changes['item_ids']) | changed)
+        logging.debug(
+            f"TODOIST_SYNC full={self.changes['full']} "
+            f"changed_items={len(self.changes['item_ids'])}"
+        )
+        self._write_changes()
+
+    def _affected_item_ids(self, response):
+        """IDs of the items whose mapped project or tags change with the
+        projects and labels of a delta, which doesn't list those items.
+        """
+        index = self.item_index
+        positions = []
+        if response.get('projects'):
+            positions += index.bucket('project_id', self._subproject_ids(
+                [p['id'] for p in response['projects']]))
+        if response.get('labels'):
+            positions += index.bucket(
+                'labels', [l['id'] for l in response['labels']])
+        return [index.id_column[pos] for pos in positions]
+
+    @property
+    def changes(self):
+        """Items changed since the last processed sync.
+
+        Read from a file next to the snapshot. A full pass is required
+        when no changes were recorded yet.
+        """
+        if self._changes is None:
+            try:
+                with open(self._changes_path()) as f:
+                    self._changes = json.load(f)
+            except (OSError, ValueError):
+                self._changes = {'full': True, 'item_ids': []}
+        return self._changes
+
+    def use_maps(self, map_project, map_tag):
+        """Set the `--map-project` and `--map-tag` maps of the run.
+
+        A full pass is required when the tasks were last processed with
+        other maps, and the maps are recorded once a full pass is done.
+        """
+        self._maps = {'project': dict(map_project), 'tag': dict(map_tag)}
+        if self.changes.get('maps') != self._maps:
+            self.changes['full'] = True
+
+    def mark_processed(self, item_ids=None, complete=False):
+        """Forget recorded changes for `item_ids`, or all of them if None.
+
+        With `complete`, `item_ids` were all the tasks, and a pending full
+        pass is done too.
+        """
+        if item_ids is None:
+            complete = True
+            self.changes['item_ids'] = []
+        else:
+            processed = set(item_ids)
+            self.changes['item_ids'] = [
+                i for i in self.changes['item_ids'] if i not in processed]
+        if complete:
+            self.changes['full'] = False
+            if self._maps is not None:
+                self.changes['maps'] = self._maps
+        self._write_changes()
+
+    def task_digest(self, task):
+        """Hash of a Todoist task with the names its project and labels map
+        to, which differs once anything the mapped task is made from changed.
+        """
+        maps = self._maps or {'project': {}, 'tag': {}}
+        values = [
+            task,
+            self.project_name_from_todoist(task['project_id'], maps['project']),
+            self.tag_names_from_todoist(task['labels'], maps['tag']),
+        ]
+        return hashlib.sha1(json.dumps(
+            values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _changes_path(self):
+        return os.path.join(self.cache_dir, f'{self.api_key}.changes.json')
+
+    def _write_changes(self):
+        os.makedirs(os.path.dirname(self._changes_path()), exist_ok=True)
+        with open(self._changes_path(), 'w') as f:
+            json.dump(self.changes, f)
 
     def project_name_from_todoist(self, project_id, map_project):
-        # Project
-        p = self.todoist.projects.get_by_id(project_id)
-        logging.debug(f"GET_PROJECT_BY_ID project_id={project_id} project={p}")
-        project_name = ''
-        if p:
-            project_hierarchy = [p]
-            while p['parent_id']:
-                p = self.todoist.projects.get_by_id(p['parent_id'])
-                project_hierarchy.insert(0, p)
-                logging.debug(f"PROJECT_HIERARCHY parent_id={p['parent_id']} hierarchy={project_hierarchy}")
-            project_name = '.'.join(p['name'] for p in project_hierarchy)
-            logging.debug(f'PROJECT_HIERARCHY project_name={project_name}')
-
-            project_name = utils.try_map(
-                map_project,
-                project_name
-            )
-        return project_name
+        """Return the Taskwarrior project name for a Todoist project.
+
+        Project hierarchies are period-delimited, then `map_project` and
+        quoting are applied. Names are computed for all projects at once and
+        cached until the mapping or the projects change.
+        """
+        if self._project_names is None or self._project_map != map_project:
+            self._project_names = self._build_project_names(map_project)
+            self._project_map = map_project
+        return self._project_names.get(project_id, '')
+
+    def _build_project_names(self, map_project):
+        projects = {p['id']: p for p in self.state.projects}
+        paths = {}
+
+        def path(project_id):
+            if project_id not in paths:
+                p = projects[project_id]
+                parent_id = p['parent_id']
+                if parent_id in projects:
+                    paths[project_id] = f"{path(parent_id)}.{p['name']}"
+                else:
+                    paths[project_id] = p['name']
+            return paths[project_id]
+
+        names = {}
+        for project_id in projects:
+            name = utils.try_map(map_project, path(project_id))
+            names[project_id] = utils.maybe_quote_ws(name) if name else name
+        logging.debug(f'PROJECT_NAMES names={names}')
+        return names
+
+    def tag_names_from_todoist(self, label_ids, map_tag):
+        """Return the Taskwarrior tags for a list of Todoist label IDs.
+
+        Labels are translated with `map_tag` and dropped when mapped to None.
+        """
+        if self._tag_names is None or self._tag_map != map_tag:
+            self._tag_names = {
+                l['id']: utils.try_map(map_tag, l['name'])
+                for l in self.state.labels
+            }
+            self._tag_map = map_tag
+        tags = (self._tag_names.get(l_id) for l_id in label_ids)
+        return [tag for tag in tags if tag]
 
 
-def make_filter_fn(filter_dict):
-    """Returns a lambda which, when given a Todoist task, will check
-    whether it has the same values for keys in `filter_dict`, returning
-    a bool
+class ItemIndex:
+    """Indexes over the Todoist items in the local state.
+
+    Every index maps a value to the positions of the matching items, in
+    state order. Only the ID index is built up front, the others on first
+    use. Indexes over the columns of a snapshot are built without reading
+    the items.
     """
-    if not filter_dict:
-        return None
 
-    def fn(task):
-        for k, v in filter_dict.items():
-            if task[k] != v:
-                return False
-        return True
+    def __init__(self, items):
+        self.items = items
+        self.size = len(items)
+        self.id_column = items.column('id')
+        self.positions = {
+            tid: pos for pos, tid in enumerate(self.id_column)
+            if tid is not None}
+        self._buckets = {}
+        self._due = None
+
+    def covers(self, items):
+        """Whether the index is still valid for the `items`."""
+        return items is self.items and len(items) == self.size
+
+    def ids(self, item_ids):
+        """Positions of the items with the given IDs."""
+        return sorted(
+            self.positions[tid] for tid in item_ids if tid in self.positions)
+
+    def bucket(self, field, values):
+        """Positions of the items whose `field` is one of `values`. For
+        list fields, like labels, any element may match.
+        """
+        if field not in self._buckets:
+            self._buckets[field] = self._build_bucket(field)
+        buckets = self._buckets[field]
+        if len(values) == 1:
+            return buckets.get(values[0], [])
+        return sorted(pos for v in values for pos in buckets.get(v, []))
+
+    def _build_bucket(self, field):
+        buckets = {}
+        for pos, value in enumerate(self.items.column(field)):
+            for v in value if isinstance(value, list) else [value]:
+                buckets.setdefault(v, []).append(pos)
+        return buckets
+
+    def due_between(self, after=None, before=None):
+        """Positions of the items due strictly between the `after` and
+        `before` dates, either of which may be None.
+        """
+        if self._due is None:
+            due = []
+            for pos, d in enumerate(self.items.column('due')):
+                if d and d.get('date'):
+                    due.append((d['date'][:10], pos))
+            due.sort()
+            self._due = ([d for d, _ in due], [pos for _, pos in due])
 
-    return fn
+        dates, positions = self._due
+        lo = bisect.bisect_right(dates, after.strftime('%Y-%m-%d')) if after else 0
+        hi = bisect.bisect_left(dates, before.strftime('%Y-%m-%d')) if before else len(dates)
+        return sorted(positions[lo:hi])
 
 
 TW_STATUS_PENDING = "pending"
 TW_STATUS_COMPLETED = "completed"
+TW_STATUS_RECURRING = "recurring"
+TW_STATUS_DELETED = "deleted"
+
+IMPORT_CHUNK_SIZE = 100
+DELETE_CHUNK_SIZE = 100
+
+# Fields of a mapped task which are written to existing TaskWarrior tasks.
+UPDATE_KEYS = ('description', 'due', 'project')
 
 
 class TaskWarrior:
@@ -83,13 +501,138 @@ class TaskWarrior:
             config_filename=config_file,
             config_overrides={'uda.todoist_id.type': 'string'},
         )
+        if hasattr(self.client, '_execute'):
+            # Count every `task` process spawned by the shell-out client
+            self.client._execute = profiling.counted(
+                'tw.subprocess', self.client._execute)
+        self._index = None
+
+    @property
+    def index(self):
+        """Return every task carrying a `todoist_id`, keyed by that ID.
+
+        The index is built lazily from a single `task export` so that lookups
+        during a run don't need to spawn a `task` process per Todoist task.
+        """
+        if self._index is None:
+            self._index = {}
+            tasks = profiling.timed('tw.export')(self.client.filter_tasks)(
+                {'todoist_id.any': ''})
+            for task in tasks:
+                # Keep the first match, as `get_task(todoist_id=...)` did.
+                self._index.setdefault(str(task['todoist_id']), task)
+            logging.debug(f'TW_INDEX size={len(self._index)}')
+        return self._index
+
+    def _reindex(self, task):
+        """Store the latest version of `task` in the index, if loaded."""
+        if task and 'todoist_id' in task and self._index is not None:
+            self._index[str(task['todoist_id'])] = task
+        return task
 
+    @profiling.timed('tw.is_changed')
+    def is_changed(self, task, data):
+        """Check whether updating `task` with `data` would change anything."""
+        return any(
+            _normalize(key, task.get(key)) != _normalize(key, getattr(data, key))
+            for key in UPDATE_KEYS
+        )
+
+    @profiling.timed('tw.update')
     def update(self, task, data):
         """Update given task with data."""
-        keys = "description due project".split()
-        for key in keys:
-            task[key] = data[key]
-        self.client.task_update(task)
+        for key in UPDATE_KEYS:
+            task[key] = getattr(data, key)
+        _, task = self.client.task_update(task)
+        return self._reindex(task)
+
+    def invalidate(self):
+        """Drop the index, e.g. after TaskWarrior was changed by others."""
+        self._index = None
+
+    def _config_section(self, name):
+        """The settings under `name` in the taskrc, as a dict.
+
+        A plain value set for `name` too, like `hooks=1` next to
+        `hooks.location=...`, is read by taskw as that value alone.
+        """
+        section = getattr(self.client, 'config', {}).get(name)
+        return section if isinstance(section, dict) else {}
+
+    def data_location(self):
+        """The directory TaskWarrior keeps its data files in."""
+        data = self._config_section('data')
+        return os.path.expanduser(data.get('location') or '~/.task')
+
+    def data_mtime(self):
+        """Latest modification time of the TaskWarrior data files, or None."""
+        location = self.data_location()
+        try:
+            return max(
+                (e.stat().st_mtime for e in os.scandir(location)
+                 if e.name.endswith('.data')),
+                default=None,
+            )
+        except OSError:
+            return None
+
+    def hooks_dir(self):
+        """The directory TaskWarrior runs hook scripts from.
+
+        This is `hooks` in the data directory unless `hooks.location` is set.
+        """
+        location = self._config_section('hooks').get('location')
+        if location:
+            return os.path.expanduser(location)
+        return os.path.join(self.data_location(), 'hooks')
+
+    def get_migrated_tasks(self, project=None, since=None):
+        """Return the tasks with a `todoist_id` which aren't deleted, with a
+        single export.
+
+        Only tasks in `project` and its subprojects, and tasks entered after
+        the datetime `since`, are returned when given.
+        """
+        filters = {'todoist_id.any': '', 'status.not': TW_STATUS_DELETED}
+        if project:
+            filters['project'] = project
+        if since:
+            filters['entry.after'] = since
+        return profiling.timed('tw.export')(self.client.filter_tasks)(filters)
+
+    def delete_tasks(self, tasks, chunk_size=DELETE_CHUNK_SIZE):
+        """Delete `tasks` with one `task <uuids> delete` per `chunk_size`
+        tasks, without running hooks.
+
+        Yields a `(deleted, failed, error)` tuple for every chunk, where
+        `failed` are the tasks still not deleted when the chunk failed with
+        the `error` message.
+        """
+        for start in range(0, len(tasks), chunk_size):
+            yield self._delete_chunk(tasks[start:start + chunk_size])
+
+    @profiling.timed('tw.delete_tasks')
+    def _delete_chunk(self, chunk):
+        try:
+            self.client._execute(
+                'rc.hooks=off', 'rc.bulk=0',
+                *[t['uuid'] for t in chunk], 'delete')
+        except TaskwarriorError as e:
+            error = _error_message(e)
+            logging.debug(f'TW_DELETE_FAILED error={error}')
+            # Check which tasks were deleted before the failure.
+            remaining = {
+                t['uuid'] for t in self.client.filter_tasks(
+                    {'or': [('uuid', t['uuid']) for t in chunk]})
+                if t['status'] != TW_STATUS_DELETED
+            }
+            deleted = [t for t in chunk if t['uuid'] not in remaining]
+            failed = [t for t in chunk if t['uuid'] in remaining]
+        else:
+            deleted, failed, error = chunk, [], None
+        deleted = [
+            self._reindex(dict(t, status=TW_STATUS_DELETED)) for t in deleted]
+        return deleted, failed, error
 
     def get_pending_tasks(self):
         """Return pending TaskWarrior tasks.
@@ -100,29 +643,199 @@ class TaskWarrior:
         """
         return self.client.filter_tasks({"status": TW_STATUS_PENDING})
 
+    @profiling.timed('tw.get_task')
     def get_task(self, tid):
         """ Given a Todoist ID, check if the task exists """
-        _, task = self.client.get_task(todoist_id=tid)
-        return task
+        return self.index.get(str(tid))
 
-    def add_task(self,
-                 tid, description, project, tags, priority, entry, due, recur):
-        """Add a taskwarrior task from todoist task
+    @profiling.timed('tw.add_task')
+    def add_task(self, data):
+        """Add a taskwarrior task from a `MappedTask`
 
         Returns the taskwarrior task.
         """
-        with io.with_feedback(f"Importing '{description}' ({project})"):
-            return self.client.task_add(
-                description,
-                project=project,
-                tags=tags,
-                priority=priority,
-                entry=entry,
-                due=due,
-                recur=recur,
-                todoist_id=tid,
+        with io.with_feedback(
+                f"Importing '{data.description}' ({data.project})", detail=True):
+            task = self.client.task_add(
+                data.description,
+                project=data.project,
+                tags=data.tags,
+                priority=data.priority,
+                entry=data.entry,
+                due=data.due,
+                recur=data.recur,
+                todoist_id=data.tid,
+            )
+        return self._reindex(task)
+
+    @profiling.timed('tw.import_tasks')
+    def import_tasks(self, tasks, chunk_size=IMPORT_CHUNK_SIZE):
+        """Import `MappedTask`s through `task import`, `chunk_size` at a time.
+
+        Tasks which are already known by `todoist_id` are skipped so the
+        import can be repeated safely. Returns a list of `(data, task)` pairs
+        where `task` is the imported TaskWarrior task or None on failure.
+        """
+        pending = {}
+        for data in tasks:
+            if self.get_task(data.tid) is None:
+                pending.setdefault(str(data.tid), data)
+        pending = list(pending.values())
+        records = [_import_record(data) for data in pending]
+        return list(zip(pending, self._import_chunks(records, chunk_size)))
+
+    @profiling.timed('tw.write_tasks')
+    def write_tasks(self, changes, chunk_size=IMPORT_CHUNK_SIZE):
+        """Write changes to exported tasks through `task import`, which
+        replaces tasks by uuid, `chunk_size` tasks at a time.
+
+        `changes` are `(task, data, close)` tuples, where the `UPDATE_KEYS` of
+        the `MappedTask` `data` are written unless it is None, and `close`
+        completes the task. Returns the written tasks, or None for failures,
+        in the same order.
+        """
+        records = [_write_record(*change) for change in changes]
+        return self._import_chunks(records, chunk_size, 'Writing')
+
+    def _import_chunks(self, records, chunk_size, verb='Importing'):
+        results = []
+        chunks = range(0, len(records), chunk_size)
+        for n, start in enumerate(chunks):
+            chunk = records[start:start + chunk_size]
+            written = []
+            try:
+                with io.with_feedback(
+                        f'{verb} chunk {n + 1} of {len(chunks)} '
+                        f'({len(chunk)} tasks)'):
+                    try:
+                        self._execute_import(chunk)
+                    except TaskwarriorError as e:
+                        logging.debug(
+                            f'TW_IMPORT_FAILED error={_error_message(e)}')
+                    # Check which tasks made it, whatever the exit status was.
+                    written = self._written_tasks(chunk)
+                    missing = written.count(None)
+                    if missing:
+                        raise errors.TaskwarriorWriteError(
+                            f'{missing} of {len(chunk)} tasks not written')
+            except errors.TaskwarriorWriteError:
+                # Reported as FAILED, and as None for each task in `results`
+                pass
+            results.extend(written)
+        return results
+
+    def _written_tasks(self, records):
+        """The tasks `records` were imported as, or None for the records
+        which weren't written.
+        """
+        imported = {
+            t['uuid']: t for t in self.client.filter_tasks(
+                {'or': [('uuid', r['uuid']) for r in records]})
+        }
+        written = []
+        for record in records:
+            task = imported.get(record['uuid'])
+            ok = task and all(
+                _normalize(key, task.get(key)) == _normalize(key, record.get(key))
+                for key in ('status',) + UPDATE_KEYS
             )
+            written.append(self._reindex(task) if ok else None)
+        return written
+
+    def _execute_import(self, records):
+        """Pipe `records` as a JSON array to a single `task import`."""
+        command = (
+            ['task']
+            + self.client.get_configuration_override_args()
+            + ['import', '-']
+        )
+        env = os.environ.copy()
+        env['TASKRC'] = self.client.config_filename
+        profiling.count('tw.subprocess')
+        proc = subprocess.run(
+            command,
+            env=env,
+            input=json.dumps(records).encode('utf-8'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if proc.returncode != 0:
+            raise TaskwarriorError(
+                command, proc.stderr, proc.stdout, proc.returncode)
+
+    @profiling.timed('tw.close')
+    def close(self, task):
+        """Close the given task.
+
+        The task is completed by uuid. `task_done` of the client looks up its
+        numeric ID first, which `task` processes of other --jobs workers may
+        renumber before it is used.
+        """
+        self.client._execute(task['uuid'], 'done')
+        _, task = self.client.get_task(uuid=task['uuid'])
+        return self._reindex(task)
+
+
+def _error_message(e):
+    """The stderr of a TaskwarriorError, as its str() is bytes on Python 3."""
+    if isinstance(e.stderr, bytes):
+        return e.stderr.decode('utf-8', 'replace')
+    return e.stderr
+
+
+def _normalize(key, value):
+    """Bring a field from an exported task or `map_to_tw` into one form."""
+    if not value:
+        return None
+    if key == 'project':
+        return utils.maybe_unquote_ws(value)
+    if key in ('entry', 'due'):
+        if 'T' in value and '-' not in value:
+            # Already in Taskwarrior's export format
+            return value
+        return encode_task_value(key, datetime.fromisoformat(value))
+    return value
+
+
+def _write_record(task, data=None, close=False):
+    """Serialize an exported task for `task import`, with the changes of
+    `write_tasks` applied.
+    """
+    record = {
+        key: value for key, value in task.items()
+        if key not in ('id', 'urgency')}
+    if data is not None:
+        for key in UPDATE_KEYS:
+            value = _normalize(key, getattr(data, key))
+            if value:
+                record[key] = value
+            else:
+                record.pop(key, None)
+    if close:
+        record['status'] = TW_STATUS_COMPLETED
+        record['end'] = encode_task_value('end', datetime.now(timezone.utc))
+    return record
+
 
-    def close(self, id):
-        """Close task by id."""
-        self.client.task_done(id=id)
+def _import_record(data):
+    """Serialize a `MappedTask` for `task import`."""
+    record = {
+        'uuid': str(uuid.uuid4()),
+        'status': TW_STATUS_PENDING,
+        'description': data.description,
+        'todoist_id': str(data.tid),
+    }
+    if data.project:
+        record['project'] = utils.maybe_unquote_ws(data.project)
+    if data.priority:
+        record['priority'] = data.priority
+    if data.tags:
+        record['tags'] = [t for t in data.tags if t]
+    for key in ('entry', 'due'):
+        value = getattr(data, key)
+        if value:
+            record[key] = encode_task_value(key, datetime.fromisoformat(value))
+    if data.recur:
+        record['recur'] = data.recur
+        record['status'] = TW_STATUS_RECURRING
+    return record
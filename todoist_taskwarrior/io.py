@@ -1,7 +1,45 @@
-"""Utilities for pretty output """
+"""Utilities for pretty output
 
+Output is written at one of three levels:
+
+- `tasks`: a line for every task processed (the default)
+- `progress`: a live progress line instead of the per-task lines
+- `summary`: only run summaries, warnings and errors
+
+Lines are buffered and written at most every `FLUSH_INTERVAL` seconds.
+Messages and events can also be written as JSON lines to an event stream.
+"""
+
+import atexit
 import contextlib
-from click import echo, prompt as cprompt, style
+import json
+import sys
+import threading
+import time
+from click import (
+    confirm as cconfirm, echo as cecho, prompt as cprompt, style, unstyle)
+
+
+LEVEL_TASKS = 'tasks'
+LEVEL_PROGRESS = 'progress'
+LEVEL_SUMMARY = 'summary'
+LEVELS = (LEVEL_TASKS, LEVEL_PROGRESS, LEVEL_SUMMARY)
+
+FLUSH_INTERVAL = 0.2
+# How often the progress line is redrawn, or logged when not on a terminal
+PROGRESS_INTERVAL = 0.2
+PROGRESS_LOG_INTERVAL = 10
+
+# Serializes output when tasks are written from several threads
+_lock = threading.Lock()
+
+_level = LEVEL_TASKS
+_events = None
+_buffer = []
+_last_flush = 0.0
+_progress_line = ''  # The progress line kept below the other output
+_progress_width = 0  # Width of the progress line shown on the terminal
+_open_line = False  # Whether the last line written is still unfinished
 
 
 _success = lambda msg, bold: style(msg, fg='green', bold=bold)
@@ -10,30 +48,124 @@ _warning = lambda msg, bold: style(msg, fg='yellow', bold=bold)
 _error = lambda msg, bold: style(msg, fg='red', bold=bold)
 
 
+def configure(level=LEVEL_TASKS, events=None):
+    """Set the output level, and the file object events are written to."""
+    global _level, _events
+    flush()
+    _level = level
+    _events = events
+
+
+def close():
+    """Flush the output and close the event stream."""
+    global _events
+    flush()
+    if _events is not None:
+        with _lock:
+            if _events not in (sys.stdout, sys.stderr):
+                _events.close()
+            _events = None
+
+
+def echo(msg, nl=True):
+    with _lock:
+        _buffer.append(f'{msg}\n' if nl else msg)
+        if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            _flush()
+
+
+@atexit.register
+def flush():
+    with _lock:
+        _flush()
+
+
+def _flush(redraw=False):
+    global _last_flush, _progress_width, _open_line
+    _last_flush = time.monotonic()
+    if not _buffer and not redraw:
+        return
+    text = ''.join(_buffer)
+    _buffer.clear()
+    if text:
+        _open_line = not text.endswith('\n')
+    if _progress_width:
+        # Lines go above the progress line, which is drawn again below them
+        text = '\r' + ' ' * _progress_width + '\r' + text
+        _progress_width = 0
+    if _progress_line and not _open_line:
+        # Not until an unfinished line, like that of `with_feedback`, is
+        # finished, as redrawing would erase it
+        text += _progress_line
+        _progress_width = len(_progress_line)
+    if text:
+        cecho(text, nl=False)
+
+
+def event(name, **fields):
+    """Write an event to the event stream, if any."""
+    if _events is None:
+        return
+    line = json.dumps(dict(time=time.time(), event=name, **fields), default=str)
+    with _lock:
+        _events.write(line + '\n')
+
+
+def _message(level, msg, styled, nl=True, detail=False):
+    event('message', level=level, message=unstyle(msg))
+    if ((_level == LEVEL_SUMMARY and level in ('info', 'success'))
+            or (detail and _level != LEVEL_TASKS)):
+        return
+    echo(styled, nl=nl)
+
+
 def info(msg, bold=False, nl=True):
-    echo(msg, nl=nl)
+    _message('info', msg, msg, nl=nl)
 
 
 def success(msg, bold=True, nl=True):
-    echo(_success(msg, bold), nl=nl)
+    _message('success', msg, _success(msg, bold), nl=nl)
 
 
 def important(msg, bold=True, nl=True):
-    echo(_important(msg, bold), nl=nl)
+    _message('important', msg, _important(msg, bold), nl=nl)
 
 
 def warn(msg, bold=True, nl=True):
-    echo(_warning(msg, bold), nl=nl)
+    _message('warning', msg, _warning(msg, bold), nl=nl)
 
 
 def error(msg, bold=True, nl=True):
-    echo(_error(msg, bold), nl=nl)
+    _message('error', msg, _error(msg, bold), nl=nl)
+
+
+def summary(msg):
+    """Write a plain line of a report, like the --profile table, shown at
+    every level.
+    """
+    _message('summary', msg, msg)
+
+
+def detail(msg, warning=False):
+    """Write a message about a single task, only shown at the `tasks`
+    level.
+    """
+    if warning:
+        _message('warning', msg, _warning(msg, True), detail=True)
+    else:
+        _message('info', msg, msg, detail=True)
 
 
 def prompt(msg, **kwargs):
+    flush()
     return cprompt(_important(msg, True), **kwargs)
 
 
+def confirm(msg, **kwargs):
+    flush()
+    return cconfirm(_important(msg, True), **kwargs)
+
+
 def task(task):
     """Pretty print a task to stdout """
 
@@ -50,9 +182,101 @@ def task(task):
     echo(output)
 
 
+class Progress:
+    """Live progress line with throughput and ETA, shown at the
+    `progress` level and sent to the event stream.
+
+    On a terminal the line is redrawn in place, otherwise it is logged every
+    `PROGRESS_LOG_INTERVAL` seconds.
+    """
+
+    def __init__(self, total, label='Tasks'):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.start = time.monotonic()
+        self._shown = self.start
+        self._tty = _level == LEVEL_PROGRESS and sys.stdout.isatty()
+        event('progress', label=label, done=0, total=total)
+
+    def advance(self, n=1):
+        self.done += n
+        now = time.monotonic()
+        interval = PROGRESS_INTERVAL if self._tty else PROGRESS_LOG_INTERVAL
+        if now - self._shown >= interval:
+            self._shown = now
+            self._show()
+
+    def close(self):
+        global _progress_line
+        event('progress', label=self.label, done=self.done, total=self.total,
+              seconds=time.monotonic() - self.start)
+        if _level != LEVEL_PROGRESS:
+            return
+        with _lock:
+            _progress_line = ''
+            _buffer.append(self.line() + '\n')
+            _flush()
+
+    def line(self):
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+        pct = self.done / self.total if self.total else 1
+        bar = ('#' * int(pct * 20)).ljust(20, '-')
+        if rate and self.done < self.total:
+            eta = time.strftime('%H:%M:%S', time.gmtime((self.total - self.done) / rate))
+        else:
+            eta = '--:--:--'
+        return (
+            f'{self.label} [{bar}] {self.done}/{self.total} ({pct:.0%}) '
+            f'{rate:.1f}/s ETA {eta}'
+        )
+
+    def _show(self):
+        global _progress_line
+        event('progress', label=self.label, done=self.done, total=self.total,
+              seconds=time.monotonic() - self.start)
+        if _level != LEVEL_PROGRESS:
+            return
+        line = self.line()
+        with _lock:
+            if self._tty:
+                _progress_line = line
+                _flush(redraw=True)
+            else:
+                _buffer.append(line + '\n')
+                _flush()
+
+
 @contextlib.contextmanager
-def with_feedback(description, success_status='OK', error_status='FAILED'):
+def with_feedback(description, success_status='OK', error_status='FAILED',
+                  detail=False):
+    """Report the outcome of the block, on the same line as `description`.
+
+    With `detail`, the block is about a single task and is only reported at
+    the `tasks` level, or when it fails.
+    """
+    if (detail and _level != LEVEL_TASKS) or _level == LEVEL_SUMMARY:
+        try:
+            yield
+        except Exception as e:
+            error(f'{description}... {error_status} ({e})')
+            raise
+        return
+
+    if threading.current_thread() is not threading.main_thread():
+        # Print a single line once done, so threads don't interleave output
+        try:
+            yield
+        except Exception as e:
+            echo(f'{description}... ' + _error(f'{error_status} ({e})', True))
+            raise
+        else:
+            echo(f'{description}... ' + _success(success_status, True))
+        return
+
     info(f'{description}... ', nl=False)
+    flush()
     try:
         yield
     except Exception as e:
@@ -60,4 +284,3 @@ def with_feedback(description, success_status='OK', error_status='FAILED'):
         raise
     else:
         success(success_status)
-
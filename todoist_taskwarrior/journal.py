@@ -0,0 +1,134 @@
+"""Journal of TaskWarrior changes to push back to Todoist
+
+Written by the TaskWarrior on-modify hook installed with `install-hook`,
+which runs this module for every modified task:
+
+    $ python -m todoist_taskwarrior.journal ~/.todoist-taskwarrior/journal.jsonl
+
+and drained by `sync`.
+"""
+
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+
+
+JOURNAL_FILE = '~/.todoist-taskwarrior/journal.jsonl'
+
+# Fields of a modified task which are recorded
+JOURNAL_KEYS = ('status', 'description', 'project', 'due')
+
+HOOK_NAME = 'on-modify.todoist-taskwarrior'
+
+
+class Journal:
+    """Append-only file of JSON entries, one line per modified task with a
+    `todoist_id`. The journal only exists while the hook is installed.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or JOURNAL_FILE)
+
+    @property
+    def enabled(self):
+        return os.path.exists(self.path) or bool(self._draining())
+
+    @property
+    def pending(self):
+        """Whether there are entries to drain."""
+        try:
+            return os.path.getsize(self.path) > 0 or bool(self._draining())
+        except OSError:
+            return bool(self._draining())
+
+    def create(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        open(self.path, 'a').close()
+
+    def remove(self):
+        for path in [self.path] + self._draining():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def append(self, entry):
+        """Append `entry` with a single write, so entries of concurrent
+        `task` processes don't interleave.
+        """
+        line = (json.dumps(entry, sort_keys=True) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    @contextlib.contextmanager
+    def drain(self):
+        """Yield the journaled entries, oldest first, and remove them once
+        the block succeeds.
+
+        The journal is renamed before reading, so tasks modified meanwhile
+        land in a new journal. Entries of a failed drain are read again by
+        the next one.
+        """
+        if os.path.exists(self.path):
+            os.replace(self.path, f'{self.path}.{time.time():.6f}.draining')
+            self.create()
+
+        paths = self._draining()
+        entries = []
+        for path in paths:
+            with open(path) as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+        yield entries
+
+        for path in paths:
+            os.remove(path)
+
+    def _draining(self):
+        return sorted(glob.glob(glob.escape(self.path) + '.*.draining'))
+
+
+def journal_entry(original, modified):
+    """Return the journal entry for a task modification, or None if the task
+    has no `todoist_id` or none of the `JOURNAL_KEYS` changed.
+    """
+    if 'todoist_id' not in modified:
+        return None
+    changed = [
+        key for key in JOURNAL_KEYS if original.get(key) != modified.get(key)]
+    if not changed:
+        return None
+    entry = {key: modified.get(key) for key in JOURNAL_KEYS}
+    entry.update(
+        todoist_id=str(modified['todoist_id']),
+        uuid=modified['uuid'],
+        changed=changed,
+        time=time.time(),
+    )
+    return entry
+
+
+def main(argv=None, stdin=sys.stdin, stdout=sys.stdout):
+    """TaskWarrior on-modify hook: echo the modified task and journal it.
+
+    The modification must never be blocked, so errors are only reported as
+    feedback.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    original = stdin.readline()
+    modified = stdin.readline()
+    stdout.write(modified)
+    try:
+        entry = journal_entry(json.loads(original), json.loads(modified))
+        if entry:
+            Journal(argv[0] if argv else None).append(entry)
+    except (OSError, ValueError) as e:
+        stdout.write(f'todoist-taskwarrior: could not journal task: {e}\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Records passed between the Todoist and TaskWarrior gateways """
+
+
+class MappedTask:
+    """A Todoist task mapped to TaskWarrior fields by `map_to_tw`.
+
+    Slotted, as a migration creates one for every Todoist task.
+    """
+
+    __slots__ = (
+        'tid', 'description', 'project', 'tags', 'priority', 'entry', 'due',
+        'recur',
+    )
+
+    def __init__(self, tid, description, project=None, tags=(),
+                 priority=None, entry=None, due=None, recur=None):
+        self.tid = tid
+        self.description = description
+        self.project = project
+        self.tags = tags
+        self.priority = priority
+        self.entry = entry
+        self.due = due
+        self.recur = recur
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def replace(self, **changes):
+        """Return a copy with the given fields changed."""
+        fields = self.as_dict()
+        fields.update(changes)
+        return MappedTask(**fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, MappedTask):
+            return NotImplemented
+        return all(
+            getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{key}={getattr(self, key)!r}' for key in self.__slots__)
+        return f'MappedTask({fields})'
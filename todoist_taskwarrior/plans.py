@@ -0,0 +1,177 @@
+"""Plans of the writes a migration would make, for `plan` and `apply`
+
+A plan is a gzip-compressed file of JSON lines. The first line describes the
+plan, every following line is one operation:
+
+- `add`: import a new TaskWarrior task, and complete it with `close`
+- `update`: write the fields of a changed task to TaskWarrior
+- `close`: complete a TaskWarrior task closed on Todoist
+- `todoist_close`: close a Todoist task completed in TaskWarrior
+
+and the last line lists the Todoist tasks the plan covers, with a digest of
+each as planned, so `apply` can tell which changed on Todoist since and keep
+them for the next run. Operations on
+existing TaskWarrior tasks carry the `modified` time they had when planned,
+so `apply` can leave tasks changed since alone. The first line also records
+the `target` the plan was written for, so it isn't applied to another
+Todoist account or TaskWarrior config.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+
+from . import errors, gateways, models
+
+
+PLAN_VERSION = 2
+
+# Rough duration of one Todoist sync request, for estimates
+TODOIST_REQUEST_SECONDS = 1.0
+
+OP_ADD = 'add'
+OP_UPDATE = 'update'
+OP_CLOSE = 'close'
+OP_TODOIST_CLOSE = 'todoist_close'
+OPS = (OP_ADD, OP_UPDATE, OP_CLOSE, OP_TODOIST_CLOSE)
+
+
+def target(api_key, taskrc):
+    """Identify the Todoist account and the TaskWarrior config a plan is
+    for, without recording the API key itself.
+    """
+    taskrc = os.path.realpath(os.path.expanduser(taskrc))
+    return hashlib.sha1(f'{api_key}\0{taskrc}'.encode('utf-8')).hexdigest()
+
+
+class PlanWriter:
+    """Write a plan one operation at a time.
+
+    The plan is written to a temporary file, which replaces `path` once
+    `finish` is called, so an interrupted `plan` never leaves a partial plan
+    behind.
+    """
+
+    def __init__(self, path, **header):
+        self.path = path
+        self.counts = Counter()
+        self._tmp_path = f'{path}.tmp'
+        self._file = gzip.open(self._tmp_path, 'wt', encoding='utf-8')
+        self._write(dict(header, version=PLAN_VERSION, created=time.time()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+
+    def add(self, op, tid, data=None, **fields):
+        """Record an operation on the Todoist task `tid`, with its
+        `MappedTask` if TaskWarrior is written to.
+        """
+        record = {'op': op, 'tid': tid}
+        if data is not None:
+            record['task'] = {
+                key: value for key, value in data.as_dict().items()
+                if value and key != 'tid'}
+        record.update((key, value) for key, value in fields.items() if value)
+        self._write(record)
+        self.counts[op] += 1
+
+    def finish(self, processed, complete=False, digests=None):
+        """Close the plan, listing the Todoist tasks it covers.
+
+        `complete` tells that `processed` is every task changed on Todoist,
+        none of them filtered out or skipped. `digests` are the digests of
+        the `processed` tasks, in the same order.
+        """
+        self._write({'op': 'end', 'processed': processed, 'complete': complete,
+                     'digests': digests or []})
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+class Plan:
+    """A plan read back by `read_plan`."""
+
+    def __init__(self, header, ops, processed, complete, digests=()):
+        self.header = header
+        self.ops = ops
+        self.processed = processed
+        self.complete = complete
+        self.digests = dict(zip(processed, digests))
+
+    @property
+    def counts(self):
+        return Counter(op['op'] for op in self.ops)
+
+    def of(self, op):
+        """The operations of one kind, in planned order."""
+        return [o for o in self.ops if o['op'] == op]
+
+
+def read_plan(path, target=None):
+    """Read a plan written by `PlanWriter`, for `target` if given.
+
+    Raises InvalidPlan if the file isn't a complete plan of this version, or
+    was written for another target.
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, EOFError, ValueError) as e:
+        raise errors.InvalidPlan(path, e)
+
+    if not records or records[0].get('version') != PLAN_VERSION:
+        raise errors.InvalidPlan(path, 'unknown plan version')
+    if records[-1].get('op') != 'end':
+        raise errors.InvalidPlan(path, 'the plan is incomplete')
+    if target is not None and records[0].get('target') != target:
+        raise errors.InvalidPlan(
+            path, 'written for another Todoist account or TaskWarrior config')
+
+    ops = records[1:-1]
+    for op in ops:
+        if op.get('op') not in OPS:
+            raise errors.InvalidPlan(path, f"unknown operation {op.get('op')!r}")
+    end = records[-1]
+    return Plan(records[0], ops, end['processed'], end['complete'],
+                end.get('digests', []))
+
+
+def mapped_task(op):
+    """The `MappedTask` of an `add` or `update` operation."""
+    return models.MappedTask(tid=op['tid'], **op['task'])
+
+
+def estimate(counts, closing, process_seconds,
+             chunk_size=gateways.IMPORT_CHUNK_SIZE):
+    """Estimate what applying a plan takes, from the `counts` of its
+    operations, the number of added tasks `closing` too, and the time a
+    `task` process took.
+
+    Returns the number of `task` processes and Todoist requests, and an
+    estimate of the time in seconds.
+    """
+    def chunks(n, size):
+        return -(-n // size)
+
+    writes = counts[OP_UPDATE] + counts[OP_CLOSE] + closing
+    # An export, then an import and a check of every chunk
+    processes = 1 + 2 * (
+        chunks(counts[OP_ADD], chunk_size) + chunks(writes, chunk_size))
+    requests = chunks(counts[OP_TODOIST_CLOSE], gateways.COMMIT_BATCH_SIZE)
+    return (
+        processes, requests,
+        processes * process_seconds + requests * TODOIST_REQUEST_SECONDS,
+    )
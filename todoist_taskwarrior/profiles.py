@@ -0,0 +1,95 @@
+"""Profiles for syncing several Todoist accounts
+
+Profiles are read from a JSON file mapping profile names to settings:
+
+    {
+        "work": {
+            "api_key_env": "TODOIST_WORK_API_KEY",
+            "taskrc": "~/.taskrc-work",
+            "map_project": {"Inbox": "work", "Taxes": null},
+            "map_tag": {"errands": "out"}
+        }
+    }
+
+Only `api_key_env` is required. Every profile gets its own Todoist cache
+directory, `~/.todoist-sync/<name>/` unless `cache_dir` is set, and its own
+hook journal.
+"""
+
+import json
+import os
+
+from . import errors, gateways, journal
+
+
+PROFILES_FILE = '~/.todoist-taskwarrior/profiles.json'
+
+PROFILE_KEYS = ('api_key_env', 'taskrc', 'cache_dir', 'map_project', 'map_tag')
+
+
+class Profile:
+    """Settings of one Todoist account and the TaskWarrior data it is synced
+    into.
+    """
+
+    def __init__(self, name, api_key_env, taskrc='~/.taskrc', cache_dir=None,
+                 map_project=None, map_tag=None):
+        self.name = name
+        self.api_key_env = api_key_env
+        self.taskrc = taskrc
+        self.cache_dir = cache_dir or os.path.join(
+            gateways.TODOIST_CACHE, name, '')
+        self.map_project = _parse_map(name, 'map_project', map_project)
+        self.map_tag = _parse_map(name, 'map_tag', map_tag)
+
+    @property
+    def api_key(self):
+        """The Todoist API key, read from the `api_key_env` variable."""
+        api_key = os.environ.get(self.api_key_env)
+        if not api_key:
+            raise errors.InvalidProfile(
+                self.name, f'${self.api_key_env} is not set')
+        return api_key
+
+    @property
+    def journal(self):
+        """The hook journal of the profile's TaskWarrior data."""
+        return os.path.join(
+            os.path.dirname(journal.JOURNAL_FILE), f'{self.name}.journal.jsonl')
+
+
+def _parse_map(name, key, value):
+    """Read a mapping like `--map-project` gives, where an empty or null
+    destination removes the project or tag.
+    """
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise errors.InvalidProfile(name, f'{key} must be an object')
+    return {src: dst or None for src, dst in value.items()}
+
+
+def load_profiles(path=None):
+    """Read the profiles file, returning the profiles by name.
+
+    Raises InvalidProfile if the file can't be read or a profile is invalid.
+    """
+    path = os.path.expanduser(path or PROFILES_FILE)
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise errors.InvalidProfile(path, e)
+    if not isinstance(config, dict):
+        raise errors.InvalidProfile(path, 'expected an object of profiles')
+
+    profiles = {}
+    for name, settings in config.items():
+        if not isinstance(settings, dict) or 'api_key_env' not in settings:
+            raise errors.InvalidProfile(name, 'api_key_env is required')
+        unknown = settings.keys() - set(PROFILE_KEYS)
+        if unknown:
+            raise errors.InvalidProfile(
+                name, f"unknown settings {', '.join(sorted(unknown))}")
+        profiles[name] = Profile(name, **settings)
+    return profiles
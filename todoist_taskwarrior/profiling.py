@@ -0,0 +1,104 @@
+"""Per-stage timings and counters for `--profile` """
+
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+
+from . import io
+
+
+_enabled = False
+_lock = threading.Lock()
+_timings = defaultdict(list)
+_counters = defaultdict(int)
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def timed(stage):
+    """Decorator recording the wall time of every call under `stage`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with _lock:
+                    _timings[stage].append(elapsed)
+        return wrapper
+    return decorator
+
+
+def count(counter, n=1):
+    """Increment `counter`, e.g. for every `task` process spawned."""
+    if _enabled:
+        with _lock:
+            _counters[counter] += n
+
+
+def counted(counter, fn):
+    """Wrap `fn` so every call increments `counter`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        count(counter)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of sorted `values`."""
+    rank = max(0, -(-len(values) * pct // 100) - 1)
+    return values[int(rank)]
+
+
+def summary():
+    """Return the recorded stages and counters as a JSON-friendly dict."""
+    with _lock:
+        stages = {}
+        for stage, values in sorted(_timings.items()):
+            values = sorted(values)
+            stages[stage] = {
+                'calls': len(values),
+                'total': sum(values),
+                'mean': sum(values) / len(values),
+                'p50': _percentile(values, 50),
+                'p90': _percentile(values, 90),
+                'p99': _percentile(values, 99),
+                'max': values[-1],
+            }
+        return {'stages': stages, 'counters': dict(sorted(_counters.items()))}
+
+
+def report(output=None):
+    """Print a summary table, and write it as JSON to `output` if given."""
+    data = summary()
+    if output:
+        with open(output, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    io.important('Profile (seconds)')
+    columns = ('calls', 'total', 'mean', 'p50', 'p90', 'p99', 'max')
+    width = max([len(s) for s in data['stages']] + [len('stage')])
+    io.summary(f"{'stage':<{width}}" + ''.join(f'{c:>10}' for c in columns))
+    for stage, s in data['stages'].items():
+        io.summary(
+            f'{stage:<{width}}{s["calls"]:>10}'
+            + ''.join(f'{s[c]:>10.4f}' for c in columns[1:])
+        )
+    for counter, value in data['counters'].items():
+        io.summary(f'{counter}: {value}')
@@ -0,0 +1,50 @@
+"""Persistent answers for unsupported Todoist recurrences """
+
+import json
+import os
+
+from . import io
+
+
+RECURRENCES_FILE = '~/.todoist-taskwarrior/recurrences.json'
+
+
+class RecurrenceStore:
+    """Taskwarrior recurrences chosen by the user for Todoist strings that
+    couldn't be parsed, keyed by the normalized Todoist string.
+
+    A value of None means the recurrence is skipped. The file is read once
+    and written back after every new answer, so answers survive aborted runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or RECURRENCES_FILE)
+        try:
+            with open(self.path) as f:
+                self.answers = json.load(f)
+            if not isinstance(self.answers, dict):
+                raise ValueError('not a JSON object')
+        except FileNotFoundError:
+            self.answers = {}
+        except ValueError as e:
+            # A truncated file mustn't stop every run. The answers are asked
+            # again, and the file is replaced by the next one.
+            io.warn(f'Ignoring invalid recurrences file {self.path}: {e}')
+            self.answers = {}
+
+    def __contains__(self, date_string):
+        return date_string in self.answers
+
+    def __getitem__(self, date_string):
+        return self.answers[date_string]
+
+    def __setitem__(self, date_string, recur):
+        self.answers[date_string] = recur
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.answers, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
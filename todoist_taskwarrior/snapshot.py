@@ -0,0 +1,383 @@
+"""Compact local copy of the items, projects and labels of a Todoist account
+
+The copy is kept in one snapshot file per account, laid out so a run can
+start without reading all of it:
+
+- a magic line and a JSON header, with the sync token and the offsets of
+  the sections below, relative to the end of the header
+- the items, as zlib-compressed JSON arrays of up to `BLOCK_SIZE` items,
+  and two arrays giving the offset and the position of the first item of
+  every block
+- one uncompressed array of 64-bit integers per indexed column (`id`,
+  `project_id` and `checked`), in item order, which is memory-mapped and
+  read in place
+- the projects and labels, as zlib-compressed JSON
+
+Items are only decompressed when looked up, one block at a time, so
+filtering by ID, project or checked state reads the columns alone. Saving
+rewrites the blocks with changed items, and copies the others as they are.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from . import errors
+
+
+MAGIC = b'TODOIST-TASKWARRIOR-SNAPSHOT\n'
+SNAPSHOT_VERSION = 2
+
+# Items per compressed block
+BLOCK_SIZE = 64
+
+COLUMNS = ('id', 'project_id', 'checked')
+
+# Stands for a missing value in a column
+NULL = -2 ** 63
+
+# Sections start at multiples of 8 bytes, so columns can be cast in place
+ALIGNMENT = 8
+
+
+class TodoistState:
+    """The items, projects and labels of a Todoist account, and the token
+    to sync the changes since.
+    """
+
+    def __init__(self, items=(), projects=(), labels=(), sync_token='*'):
+        self.items = items
+        self.projects = list(projects)
+        self.labels = list(labels)
+        self.sync_token = sync_token
+        self._changed = False
+
+    @property
+    def items(self):
+        """The `Items`. Can be set to a list of item dicts."""
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items if isinstance(items, Items) else Items(items)
+
+    @property
+    def changed(self):
+        """Whether the state changed since it was loaded or saved."""
+        return self._changed or self.items.changed
+
+    @classmethod
+    def load(cls, path):
+        """Open the snapshot at `path`. Items are read as they are used.
+
+        Raises InvalidSnapshot if the file can't be read.
+        """
+        snapshot = Snapshot(path)
+        meta = snapshot.meta()
+        return cls(Items(snapshot=snapshot), meta['projects'], meta['labels'],
+                   snapshot.sync_token)
+
+    def save(self, path):
+        """Write the state to the snapshot at `path`, replacing it at once,
+        and read the items from there on.
+        """
+        write_snapshot(path, self)
+        self.items = Items(snapshot=Snapshot(path))
+        self._changed = False
+
+    def apply(self, response):
+        """Merge the changes of a sync response, like the Todoist client
+        merges them into its state.
+        """
+        if response.get('sync_token', self.sync_token) != self.sync_token:
+            self.sync_token = response['sync_token']
+            self._changed = True
+        if response.get('items'):
+            self.items.merge(response['items'])
+        if response.get('projects'):
+            self.projects = _merge(self.projects, response['projects'])
+            self._changed = True
+        if response.get('labels'):
+            self.labels = _merge(self.labels, response['labels'])
+            self._changed = True
+
+
+def _merge(objects, changes):
+    positions = {o['id']: pos for pos, o in enumerate(objects)}
+    objects = list(objects)
+    for change in changes:
+        pos = positions.get(change['id'])
+        if pos is None:
+            positions[change['id']] = len(objects)
+            objects.append(change)
+        else:
+            objects[pos] = dict(objects[pos], **change)
+    return [o for o in objects if not o.get('is_deleted')]
+
+
+class Items:
+    """The items of a `TodoistState`, in sync order, by position.
+
+    Items of a snapshot are decompressed when looked up, a block at a time,
+    and only the last block is kept. Changes are made through `replace`,
+    `update`, `delete` and `append`, which keep the changed items until the
+    state is saved. A deleted item leaves its position empty until then.
+    """
+
+    def __init__(self, items=(), snapshot=None):
+        self._snapshot = snapshot
+        self._base = snapshot.count if snapshot else 0
+        self._added = list(items)
+        self._replaced = {}
+        self._deleted = set()
+        self._block = (None, None)
+
+    def __len__(self):
+        """The number of positions, including the empty ones."""
+        return self._base + len(self._added)
+
+    def __getitem__(self, pos):
+        """The item at `pos`, or None for a deleted item."""
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError('item position out of range')
+        if pos in self._deleted:
+            return None
+        if pos >= self._base:
+            return self._added[pos - self._base]
+        if pos in self._replaced:
+            return self._replaced[pos]
+        n = self._snapshot.block_of(pos)
+        if self._block[0] != n:
+            self._block = (n, self._snapshot.block(n))
+        return self._block[1][pos - self._snapshot.block_starts[n]]
+
+    def __iter__(self):
+        """The items, without empty positions."""
+        return (
+            self[pos] for pos in range(len(self)) if pos not in self._deleted)
+
+    @property
+    def changed(self):
+        return bool(self._added or self._replaced or self._deleted)
+
+    def replace(self, pos, item):
+        if pos >= self._base:
+            self._added[pos - self._base] = item
+        else:
+            self._replaced[pos] = item
+
+    def update(self, pos, **fields):
+        self.replace(pos, dict(self[pos], **fields))
+
+    def delete(self, pos):
+        self._deleted.add(pos)
+
+    def append(self, item):
+        """Add an item, returning its position."""
+        self._added.append(item)
+        return len(self) - 1
+
+    def merge(self, changes):
+        """Merge changed items from a sync response."""
+        positions = {
+            tid: pos for pos, tid in enumerate(self.column('id'))
+            if tid is not None}
+        for change in changes:
+            pos = positions.get(change['id'])
+            if change.get('is_deleted'):
+                if pos is not None:
+                    self.delete(pos)
+            elif pos is None:
+                positions[change['id']] = self.append(change)
+            else:
+                self.update(pos, **change)
+
+    def column(self, field):
+        """The `field` of every item, or None at empty positions. Indexed
+        columns of a snapshot are read without decompressing the items.
+        """
+        if self._snapshot is None or field not in self._snapshot.columns:
+            items = (self[pos] for pos in range(len(self)))
+            return [None if item is None else item.get(field) for item in items]
+        values = self._snapshot.column(field)
+        for pos, item in self._replaced.items():
+            values[pos] = item.get(field)
+        values.extend(item.get(field) for item in self._added)
+        for pos in self._deleted:
+            values[pos] = None
+        return values
+
+    def blocks(self):
+        """The items to write to a snapshot, in order.
+
+        Yields the `(data, columns, count)` of every unchanged block of the
+        snapshot, to be copied as is, and lists of items otherwise. Items
+        added since are written with the last block if it isn't full.
+        """
+        added = [
+            item for pos, item in enumerate(self._added, self._base)
+            if pos not in self._deleted]
+        snapshot = self._snapshot
+        if snapshot is None:
+            yield added
+            return
+
+        touched = {snapshot.block_of(pos) for pos in self._replaced}
+        touched.update(
+            snapshot.block_of(pos) for pos in self._deleted if pos < self._base)
+        last = len(snapshot.block_starts) - 2
+        for n in range(last + 1):
+            start, end = snapshot.block_starts[n], snapshot.block_starts[n + 1]
+            if n in touched or (n == last and added and end - start < BLOCK_SIZE):
+                items = [
+                    self[pos] for pos in range(start, end)
+                    if pos not in self._deleted]
+                if n == last:
+                    items, added = items + added, []
+                yield items
+            else:
+                yield snapshot.raw_block(n)
+        if added:
+            yield added
+
+
+class Snapshot:
+    """A snapshot file, memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            prefix = len(MAGIC) + 4
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a snapshot file')
+            header_size, = struct.unpack('<I', self._map[len(MAGIC):prefix])
+            header = json.loads(self._map[prefix:prefix + header_size])
+            if header.get('version') != SNAPSHOT_VERSION:
+                raise ValueError('unknown snapshot version')
+            if header['byteorder'] != sys.byteorder:
+                raise ValueError('written on a platform of another byte order')
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            raise errors.InvalidSnapshot(path, e)
+
+        self.sync_token = header['sync_token']
+        self.count = header['count']
+        self._data = memoryview(self._map)[_aligned(prefix + header_size):]
+        self.columns = {
+            name: self._array(offset, self.count)
+            for name, offset in header['columns'].items()
+        }
+        blocks = header['blocks']
+        self._offsets = self._array(header['block_offsets'], blocks + 1)
+        self.block_starts = self._array(header['block_starts'], blocks + 1)
+        self._meta = header['meta']
+
+    def _array(self, offset, count):
+        return self._data[offset:offset + 8 * count].cast('q')
+
+    def column(self, name):
+        """The values of an indexed column, as a list."""
+        return [None if v == NULL else v for v in self.columns[name]]
+
+    def meta(self):
+        """The projects and labels."""
+        offset, size = self._meta
+        return json.loads(zlib.decompress(self._data[offset:offset + size]))
+
+    def block_of(self, pos):
+        """The number of the block holding the item at `pos`."""
+        return bisect.bisect_right(self.block_starts, pos) - 1
+
+    def block(self, n):
+        """The items of the `n`th block."""
+        return json.loads(zlib.decompress(self.raw_block(n)[0]))
+
+    def raw_block(self, n):
+        """The compressed data of the `n`th block, the slices of the
+        columns for its items, and their number.
+        """
+        start, end = self.block_starts[n], self.block_starts[n + 1]
+        data = self._data[self._offsets[n]:self._offsets[n + 1]]
+        columns = {name: c[start:end] for name, c in self.columns.items()}
+        return data, columns, end - start
+
+
+def write_snapshot(path, state):
+    """Write a `TodoistState` to a snapshot file."""
+    sections = []
+    size = 0
+
+    def add(data):
+        nonlocal size
+        offset = size
+        padding = -len(data) % ALIGNMENT
+        sections.append(data)
+        sections.append(b'\0' * padding)
+        size += len(data) + padding
+        return offset
+
+    columns = {name: array('q') for name in COLUMNS}
+    offsets, starts = array('q'), array('q', [0])
+
+    def add_block(data, values, count):
+        offsets.append(add(data))
+        starts.append(starts[-1] + count)
+        for name in COLUMNS:
+            columns[name].extend(values[name])
+
+    for block in state.items.blocks():
+        if isinstance(block, tuple):
+            add_block(*block)
+            continue
+        for start in range(0, len(block), BLOCK_SIZE):
+            items = block[start:start + BLOCK_SIZE]
+            values = {
+                name: array('q', (_column_value(i.get(name)) for i in items))
+                for name in COLUMNS
+            }
+            add_block(_compress(items), values, len(items))
+    offsets.append(size)
+
+    meta = _compress({'projects': state.projects, 'labels': state.labels})
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'byteorder': sys.byteorder,
+        'sync_token': state.sync_token,
+        'count': starts[-1],
+        'columns': {name: add(c.tobytes()) for name, c in columns.items()},
+        'blocks': len(offsets) - 1,
+        'block_offsets': add(offsets.tobytes()),
+        'block_starts': add(starts.tobytes()),
+        'meta': [add(meta), len(meta)],
+    }).encode('utf-8')
+    prefix = len(MAGIC) + 4 + len(header)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * (_aligned(prefix) - prefix))
+        f.writelines(sections)
+    os.replace(tmp_path, path)
+
+
+def _compress(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _column_value(value):
+    return NULL if value is None else int(value)
+
+
+def _aligned(n):
+    return n + -n % ALIGNMENT
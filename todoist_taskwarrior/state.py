@@ -0,0 +1,164 @@
+"""Local record of which Todoist task is linked to which TaskWarrior task """
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from . import gateways
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS links (
+    todoist_id TEXT PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    status TEXT NOT NULL,
+    hash TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_uuid ON links (uuid);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+Link = collections.namedtuple(
+    'Link', ['todoist_id', 'uuid', 'status', 'hash', 'synced_at'])
+
+
+def state_path(api_key, cache_dir=None):
+    """The state database of an account, next to the Todoist cache."""
+    return os.path.join(
+        os.path.expanduser(cache_dir or gateways.TODOIST_CACHE),
+        f'{api_key}.state.sqlite3')
+
+
+def content_hash(data):
+    """Hash of the fields of a `MappedTask` that are kept up to date."""
+    values = [getattr(data, key) for key in gateways.UPDATE_KEYS]
+    return hashlib.sha1(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+class StateStore:
+    """SQLite database of the TaskWarrior task linked to each Todoist task,
+    with the content hash and status it had when last written.
+
+    It lets `migrate` tell new, changed and unchanged tasks apart without
+    exporting from TaskWarrior. The store can only be trusted after it was
+    rebuilt from an export once, and as long as every run writing to
+    TaskWarrior finished its transaction; `needs_rebuild` tells when not.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    @property
+    def db(self):
+        """The database connection, opened (and created) on first use."""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get(self, todoist_id):
+        """Return the `Link` of a Todoist task, or None."""
+        row = self.db.execute(
+            'SELECT * FROM links WHERE todoist_id = ?', (str(todoist_id),)
+        ).fetchone()
+        return Link(*row) if row else None
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+
+    def link(self, todoist_id, tw_task, hash=None):
+        """Record that `tw_task` was written for a Todoist task."""
+        self.db.execute(
+            'INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?)',
+            (str(todoist_id), tw_task['uuid'], tw_task['status'], hash,
+             time.time()),
+        )
+
+    def set_status(self, todoist_ids, status):
+        """Record a new status for the tasks of several Todoist tasks."""
+        self.db.executemany(
+            'UPDATE links SET status = ?, synced_at = ? WHERE todoist_id = ?',
+            ((status, time.time(), str(tid)) for tid in todoist_ids))
+
+    def _get_meta(self, key):
+        row = self.db.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute(
+            'INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def needs_rebuild(self):
+        """Whether the store was never rebuilt, or a run writing to
+        TaskWarrior didn't finish.
+        """
+        return not self._get_meta('verified_at') or bool(self._get_meta('dirty'))
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group the links recorded by one run in a single transaction.
+
+        The store is flagged dirty until the transaction is committed, so
+        that a crashed run, which may have written to TaskWarrior without
+        recording it, triggers a rebuild.
+        """
+        self._set_meta('dirty', '1')
+        self.db.execute('BEGIN')
+        try:
+            yield self
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self._set_meta('dirty', '')
+        self.db.execute('COMMIT')
+
+    def rebuild(self, tw_tasks):
+        """Replace all links with the given exported TaskWarrior tasks.
+
+        Hashes are unknown after a rebuild, so the next run compares those
+        tasks with TaskWarrior once. Returns the number of links added,
+        removed and changed.
+        """
+        old = {link.todoist_id: link for link in map(
+            Link._make, self.db.execute('SELECT * FROM links'))}
+        new = {str(t['todoist_id']): t for t in tw_tasks}
+        self.db.execute('BEGIN')
+        try:
+            self.db.execute('DELETE FROM links')
+            for todoist_id, task in new.items():
+                link = old.get(todoist_id)
+                same = link and (link.uuid, link.status) == (
+                    task['uuid'], task['status'])
+                self.link(todoist_id, task, link.hash if same else None)
+            self._set_meta('verified_at', str(time.time()))
+            self._set_meta('dirty', '')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+        return {
+            'added': len(new.keys() - old.keys()),
+            'removed': len(old.keys() - new.keys()),
+            'changed': sum(
+                1 for tid in new.keys() & old.keys()
+                if (old[tid].uuid, old[tid].status)
+                != (new[tid]['uuid'], new[tid]['status'])
+            ),
+        }
@@ -1,8 +1,9 @@
 import click
+import functools
 import re
 import dateutil.parser
 from .errors import UnsupportedRecurrence
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 
 """ Mappings """
@@ -15,12 +16,13 @@ def try_map(m, value):
         return value
 
 
-def try_get_model_prop(m, key, default=None):
-    """ The todoist models don't seem to have the `get()` method and throw KeyErrors """
-    try:
-        return m[key]
-    except KeyError:
-        return default
+def model_fields(m):
+    """ The fields of a todoist model as a dict.
+
+    The todoist models don't have the `get()` method and throw KeyErrors,
+    but keep their fields in `data`. Plain dicts are returned as is.
+    """
+    return getattr(m, 'data', m)
 
 
 """ Priorities """
@@ -45,6 +47,13 @@ def maybe_quote_ws(value):
     return value
 
 
+def maybe_unquote_ws(value):
+    """Reverses `maybe_quote_ws`, for places where no shell parsing happens. """
+    if value and len(value) > 1 and value[0] == value[-1] == "'":
+        return value[1:-1]
+    return value
+
+
 """ Dates """
 
 def parse_due(due):
@@ -73,13 +82,33 @@ def parse_date(date, delta=None):
     if not date:
         return None
 
-    parsed = dateutil.parser.parse(date)
+    parsed = _parse_iso_date(date)
     if delta:
         parsed += delta
 
     return parsed.isoformat()
 
 
+def _parse_iso_date(date):
+    """Parse the ISO-8601 shapes Todoist uses with `datetime.fromisoformat`:
+
+    - 2016-12-01
+    - 2016-12-01T12:00:00
+    - 2016-12-01T12:00:00Z (and with fractional seconds or an offset)
+
+    Anything else falls back to the much slower `dateutil` parser.
+    """
+    if date[-1:] == 'Z':
+        date = date[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(date)
+    except ValueError:
+        return dateutil.parser.parse(date)
+
+
+RECUR_CACHE_SIZE = 1024
+
+
 def parse_recur(due):
     """Given a due object, extracts the recur """
     if not due or not due['is_recurring']:
@@ -105,20 +134,35 @@ def parse_recur_string(date_string):
     """
     if not date_string:
         return
-    # Normalize:
-    # - trim leading, trailing, and, duplicate spaces
-    # - convert to lowercase
-    date_string = ' '.join(date_string.lower().strip().split())
-    result = (
+    date_string = normalize_recur_string(date_string)
+    result = _parse_normalized_recur(date_string)
+    if not result:
+        raise UnsupportedRecurrence(date_string)
+    return result
+
+
+def normalize_recur_string(date_string):
+    """Normalize a Todoist `date_string` for parsing:
+    - trim leading, trailing, and, duplicate spaces
+    - convert to lowercase
+    """
+    return ' '.join(date_string.lower().strip().split())
+
+
+@functools.lru_cache(maxsize=RECUR_CACHE_SIZE)
+def _parse_normalized_recur(date_string):
+    """Parse a normalized `date_string`, returning None if unsupported.
+
+    Accounts reuse a handful of recurrences, so results (including
+    unsupported ones) are cached.
+    """
+    return (
         _recur_single_cycle(date_string) or
         _recur_multi_cycle(date_string) or
         _recur_day_of_week(date_string) or
         _recur_day_of_month(date_string) or
         _recur_special(date_string)
     )
-    if not result:
-        raise UnsupportedRecurrence(date_string)
-    return result
 
 
 # Atoms
@@ -16,6 +16,12 @@ def validate_map(ctx, param, value):
     return map_project
 
 
+def validate_positive(ctx, param, value):
+    if value is not None and value <= 0:
+        raise click.BadParameter(f'{value} is not a positive number')
+    return value
+
+
 def validate_recur(value):
     try:
         return utils.parse_recur_string(value)